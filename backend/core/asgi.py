@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Load the semantic search models (and corpus) in the background as the server
+# starts, so the first searches of each worker are not turned away with a 503
+from documents.readiness import preload  # noqa: E402
+
+preload()
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_ready
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
@@ -16,6 +17,25 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def warm_embedding_models(**kwargs):
+    """Load the models tasks use once in each prefork child before it takes tasks."""
+    from django.conf import settings
+    from documents.model_registry import warm_up
+    warm_up(names=settings.CELERY_EMBEDDING_WARMUP_MODELS)
+
+
+@worker_ready.connect
+def warm_embedding_models_in_main_process(sender=None, **kwargs):
+    """Solo and thread pools run tasks in the main process, which gets no worker_process_init."""
+    from celery.concurrency.prefork import TaskPool as PreforkPool
+    if isinstance(getattr(sender, 'pool', None), PreforkPool):
+        return
+    from django.conf import settings
+    from documents.model_registry import warm_up
+    warm_up(names=settings.CELERY_EMBEDDING_WARMUP_MODELS)
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}') 
\ No newline at end of file
@@ -260,6 +260,90 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Asia/Jakarta" # Example, adjust to your timezone
 
+# Parallel page OCR (documents.ocr): tesseract processes per worker process,
+# 0 = one per CPU core. Lower it when several Celery processes share a node.
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "0"))
+# PDF pages rasterized per poppler call; with OCR_WORKERS this bounds OCR memory
+OCR_RASTER_WINDOW = int(os.environ.get("OCR_RASTER_WINDOW", "8"))
+# Per-page text layer vs OCR routing (documents.extraction): pages whose
+# embedded text scores below TEXT_LAYER_MIN_SCORE (0-1) are OCRed; pages with
+# fewer than TEXT_LAYER_MIN_CHARS visible characters score proportionally lower
+TEXT_LAYER_MIN_SCORE = float(os.environ.get("TEXT_LAYER_MIN_SCORE", "0.5"))
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("TEXT_LAYER_MIN_CHARS", "100"))
+# Content-addressed extraction cache (documents.extraction_cache): reuse the
+# per-page text of a file already extracted with the same configuration
+EXTRACTION_CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE_ENABLED", "True") == "True"
+
+# Query embedding cache (documents.query_cache): in-process LRU in front of Redis.
+# Set QUERY_EMBEDDING_CACHE_REDIS_URL to an empty string to keep it in-process only.
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL = int(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+QUERY_EMBEDDING_CACHE_REDIS_URL = os.environ.get(
+    "QUERY_EMBEDDING_CACHE_REDIS_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/1"
+)
+
+# Micro-batching of concurrent query encodes (documents.batch_encoder)
+QUERY_BATCH_ENABLED = os.environ.get("QUERY_BATCH_ENABLED", "True") == "True"
+QUERY_BATCH_WINDOW_MS = float(os.environ.get("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.environ.get("QUERY_BATCH_MAX_SIZE", "32"))
+
+# Maximum number of queries accepted by one json-search/batch/ request
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", "50"))
+
+# Semantic search corpus produced by process_kitabs_standalone.py
+SEMANTIC_SEARCH_DATA_DIR = Path(os.environ.get("SEMANTIC_SEARCH_DATA_DIR", BASE_DIR.parent))
+# Seconds between checks for a new corpus generation on disk (0 disables hot reload)
+SEMANTIC_SEARCH_RELOAD_INTERVAL = float(os.environ.get("SEMANTIC_SEARCH_RELOAD_INTERVAL", "30"))
+# Retry-After (seconds) sent with the 503 returned while models/corpus are loading
+SEMANTIC_SEARCH_RETRY_AFTER = int(os.environ.get("SEMANTIC_SEARCH_RETRY_AFTER", "5"))
+
+# Embedding models loaded once per process (see documents.model_registry).
+# Web processes load them in background threads when "models" is in
+# SEMANTIC_SEARCH_PRELOAD (see documents.readiness).
+EMBEDDING_WARMUP_MODELS = [
+    name.strip() for name in os.environ.get(
+        "EMBEDDING_WARMUP_MODELS",
+        "paraphrase-multilingual-mpnet-base-v2,paraphrase-multilingual-MiniLM-L12-v2"
+    ).split(",") if name.strip()
+]
+# Models every Celery worker process loads before taking tasks. Tasks only
+# embed documents, so the (much larger) search model is left out by default.
+CELERY_EMBEDDING_WARMUP_MODELS = [
+    name.strip() for name in os.environ.get(
+        "CELERY_EMBEDDING_WARMUP_MODELS", "paraphrase-multilingual-MiniLM-L12-v2"
+    ).split(",") if name.strip()
+]
+# Semantic search components ("models", "corpus") web processes start loading at
+# startup; others load on first use. Postgres-only deployments can drop "corpus"
+# to keep the JSON corpus out of web worker memory.
+SEMANTIC_SEARCH_PRELOAD = [
+    name.strip() for name in os.environ.get("SEMANTIC_SEARCH_PRELOAD", "models,corpus").split(",")
+    if name.strip()
+]
+
+# Approximate nearest neighbour search (mode=ann): IVF cells probed for the
+# JSON corpus, and pgvector HNSW candidate list size for TextChunk search
+ANN_DEFAULT_NPROBE = int(os.environ.get("ANN_DEFAULT_NPROBE", "8"))
+ANN_DEFAULT_EF_SEARCH = int(os.environ.get("ANN_DEFAULT_EF_SEARCH", "40"))
+
+# Quantized search (mode=quantized): "int8" or "binary" codes generate
+# limit * rescore factor candidates which are re-scored against float vectors.
+# The JSON corpus falls back to exact search if sampled recall@10 is below the floor.
+# Binary is the default because it is the faster scan: int8 saves memory but
+# its candidate scan is slower than exact search (see documents.quantization).
+# One bit per dimension needs a wide candidate list: re-scoring 40 candidates
+# per result keeps recall@10 near 1 for little more than the cost of the scan.
+QUANTIZATION_KIND = os.environ.get("QUANTIZATION_KIND", "binary")
+QUANTIZED_RESCORE_FACTOR = int(os.environ.get("QUANTIZED_RESCORE_FACTOR", "40"))
+QUANTIZED_RECALL_FLOOR = float(os.environ.get("QUANTIZED_RECALL_FLOOR", "0.9"))
+
+# Hybrid document search (type=hybrid): keyword and semantic candidates,
+# capped per retriever, fused with weighted reciprocal rank fusion
+HYBRID_CANDIDATE_BUDGET = int(os.environ.get("HYBRID_CANDIDATE_BUDGET", "100"))
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+HYBRID_KEYWORD_WEIGHT = float(os.environ.get("HYBRID_KEYWORD_WEIGHT", "1.0"))
+HYBRID_SEMANTIC_WEIGHT = float(os.environ.get("HYBRID_SEMANTIC_WEIGHT", "1.0"))
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # Next.js development server
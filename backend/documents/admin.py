@@ -1,7 +1,8 @@
 from django.contrib import admin
+from .corpus_stats import schedule_kitab_statistics_refresh
 from .models import (
     Document, DocumentVersion, DocumentAnnotation, DocumentCrossReference,
-    DocumentAnalysisStatus, TextChunk
+    DocumentAnalysisStatus, ExtractionCache, KitabStatistics, TextChunk
 )
 
 
@@ -26,6 +27,30 @@ class TextChunkAdmin(admin.ModelAdmin):
     search_fields = ['content_arabic', 'kitab_name', 'author']
     readonly_fields = ['id', 'created_at', 'updated_at']
 
+    def delete_model(self, request, obj):
+        key = (obj.kitab_name, obj.author)
+        super().delete_model(request, obj)
+        schedule_kitab_statistics_refresh([key])
+
+    def delete_queryset(self, request, queryset):
+        keys = list(queryset.values_list('kitab_name', 'author').distinct())
+        super().delete_queryset(request, queryset)
+        schedule_kitab_statistics_refresh(keys)
+
+
+@admin.register(KitabStatistics)
+class KitabStatisticsAdmin(admin.ModelAdmin):
+    list_display = ['kitab_name', 'author', 'chunk_count', 'updated_at']
+    search_fields = ['kitab_name', 'author']
+    readonly_fields = ['chunk_count', 'updated_at']
+
+
+@admin.register(ExtractionCache)
+class ExtractionCacheAdmin(admin.ModelAdmin):
+    list_display = ['checksum', 'config_version', 'hit_count', 'created_at', 'last_used_at']
+    search_fields = ['checksum']
+    readonly_fields = ['created_at', 'last_used_at', 'hit_count']
+
 
 admin.site.register(DocumentVersion)
 admin.site.register(DocumentAnnotation)
@@ -0,0 +1,228 @@
+"""
+Inverted-file (IVF) approximate nearest neighbour index built with numpy.
+
+A spherical k-means coarse quantiser splits the normalised chunk embeddings
+into ``n_lists`` cells. A query is compared with the centroids, and only the
+rows in the ``nprobe`` closest cells are scored exactly, so search cost
+grows with ``nprobe * n / n_lists`` instead of ``n``. Raising ``nprobe`` trades
+latency for recall per request.
+
+The index stores row numbers only; vectors stay in the embedding matrix
+(usually the memory-mapped store), and the index is persisted as an ``.npz``
+file next to it. Worker processes that all find it missing take a file lock
+before training, so only one of them runs k-means and the others load its
+result.
+"""
+
+import contextlib
+import logging
+import math
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every process builds its own
+    fcntl = None
+
+import numpy as np
+
+from .embedding_index import normalize_rows, normalize_vector, top_k
+
+logger = logging.getLogger(__name__)
+
+ANN_FORMAT_VERSION = 1
+_ASSIGN_BLOCK_ROWS = 65536
+
+
+def save_npz_atomic(path, **arrays):
+    """
+    Write an ``.npz`` file through a uniquely named temporary file, so
+    workers saving the same index at once never write into each other's file.
+    """
+    directory, name = os.path.split(os.fspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _assign(matrix, centroids):
+    """Index of the nearest centroid for every row, computed in blocks."""
+    assignments = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], _ASSIGN_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """Approximate cosine search over the rows of a normalised embedding matrix."""
+
+    def __init__(self, centroids, lists, fingerprint=None):
+        """
+        Args:
+            centroids: (n_lists, dim) float32 unit vectors.
+            lists: One int64 array of matrix row numbers per centroid.
+            fingerprint: Identifies the matrix the index was built for.
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.lists = [np.asarray(rows, dtype=np.int64) for rows in lists]
+        self.fingerprint = fingerprint
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    def __len__(self):
+        return sum(rows.size for rows in self.lists)
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, n_iter=10, sample_size=None, seed=0, fingerprint=None):
+        """
+        Train the coarse quantiser on a sample of ``matrix`` and assign every row.
+
+        ``n_lists`` defaults to sqrt(n), which keeps cells around sqrt(n) rows.
+        """
+        n_rows = matrix.shape[0]
+        if n_rows == 0:
+            raise ValueError("Cannot build an ANN index over an empty matrix")
+        if n_lists is None:
+            n_lists = int(math.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(n_rows, sample_size or max(n_lists * 64, 10000))
+        sample_rows = np.sort(rng.choice(n_rows, size=sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty cells with random sample rows
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        assignments = _assign(matrix, centroids)
+        order = np.argsort(assignments, kind='stable')
+        boundaries = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        lists = [order[boundaries[i]:boundaries[i + 1]] for i in range(n_lists)]
+        return cls(centroids, lists, fingerprint=fingerprint)
+
+    def search(self, matrix, query_embedding, limit=10, threshold=0.0, nprobe=8):
+        """
+        Rank the rows of ``matrix`` in the ``nprobe`` cells closest to the query.
+
+        Returns:
+            A ``(indices, scores)`` pair of arrays ordered by descending score.
+        """
+        query = normalize_vector(query_embedding)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.lists[cell] for cell in cells])
+        if candidates.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        candidates.sort()  # sequential access into the memory map
+        scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+        best = top_k(scores, limit, threshold)
+        return candidates[best], scores[best]
+
+    def save(self, path):
+        lengths = np.array([rows.size for rows in self.lists], dtype=np.int64)
+        rows = np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64)
+        save_npz_atomic(
+            path,
+            format_version=np.array(ANN_FORMAT_VERSION),
+            fingerprint=np.array(self.fingerprint or ''),
+            centroids=self.centroids,
+            lengths=lengths,
+            rows=rows,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['format_version']) != ANN_FORMAT_VERSION:
+                raise ValueError(f"Unsupported ANN index version in {path}")
+            offsets = np.concatenate([[0], np.cumsum(data['lengths'])])
+            rows = data['rows']
+            lists = [rows[offsets[i]:offsets[i + 1]] for i in range(len(data['lengths']))]
+            return cls(data['centroids'], lists, fingerprint=str(data['fingerprint']) or None)
+
+
+def load_matching(path, fingerprint, n_rows):
+    """The index persisted at ``path`` if it was built for this matrix, else None."""
+    try:
+        index = IVFIndex.load(path)
+        if index.fingerprint == fingerprint and len(index) == n_rows:
+            return index
+        logger.info(f"ANN index {path} is stale")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Error loading ANN index {path}: {e}")
+    return None
+
+
+def build_and_save(path, matrix, fingerprint, **build_options):
+    """Build the index over ``matrix`` and try to persist it at ``path``."""
+    index = IVFIndex.build(matrix, fingerprint=fingerprint, **build_options)
+    logger.info(f"Built ANN index: {len(index)} rows in {index.n_lists} lists")
+    try:
+        index.save(path)
+    except OSError as e:
+        logger.warning(f"Could not persist ANN index to {path}: {e}")
+    return index
+
+
+@contextlib.contextmanager
+def build_lock(path):
+    """
+    Exclusive lock on ``<path>.lock`` shared by all processes on the host,
+    held while building the index at ``path``. Without ``fcntl`` or a
+    writable directory the build simply runs unlocked.
+    """
+    if fcntl is None:
+        yield
+        return
+    try:
+        lock_file = open(f"{os.fspath(path)}.lock", 'a')
+    except OSError as e:
+        logger.warning(f"Could not open the ANN build lock for {path}: {e}")
+        yield
+        return
+    with lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def load_or_build(path, matrix, fingerprint, **build_options):
+    """
+    Load the index persisted at ``path`` if it matches ``fingerprint``,
+    otherwise build it over ``matrix`` and try to persist it. Builds are
+    serialised across processes by ``build_lock``; a process that waited
+    for the lock loads the index the previous holder saved.
+    """
+    index = load_matching(path, fingerprint, matrix.shape[0])
+    if index is None:
+        with build_lock(path):
+            index = load_matching(path, fingerprint, matrix.shape[0])
+            if index is None:
+                index = build_and_save(path, matrix, fingerprint, **build_options)
+    return index
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class DocumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'documents' 
\ No newline at end of file
+    name = 'documents'
+
+    def ready(self):
+        # Keeps KitabStatistics current for chunk writes outside process_books
+        from . import signals  # noqa: F401
@@ -0,0 +1,50 @@
+"""
+Arabic text normalization for keyword search.
+
+Kitab text is inconsistent in its orthography: the same word appears with or
+without tashkeel, with different hamza carriers, and with ta marbuta or ha.
+Both the stored search column and incoming search terms go through
+``normalize_arabic`` so such variants match each other.
+"""
+
+import re
+import unicodedata
+
+# Tashkeel, Quranic annotation marks, superscript alef and tatweel
+_DIACRITICS = (
+    [chr(c) for c in range(0x0610, 0x061B)]
+    + [chr(c) for c in range(0x064B, 0x0660)]
+    + ['\u0670', '\u0640']
+    + [chr(c) for c in range(0x06D6, 0x06EE)]
+)
+
+_FOLDS = {
+    '\u0622': '\u0627',  # alef with madda -> alef
+    '\u0623': '\u0627',  # alef with hamza above -> alef
+    '\u0625': '\u0627',  # alef with hamza below -> alef
+    '\u0671': '\u0627',  # alef wasla -> alef
+    '\u0624': '\u0648',  # waw with hamza -> waw
+    '\u0626': '\u064a',  # ya with hamza -> ya
+    '\u0649': '\u064a',  # alef maqsura -> ya
+    '\u06cc': '\u064a',  # farsi ya -> ya
+    '\u0629': '\u0647',  # ta marbuta -> ha
+}
+
+_TRANSLATION = str.maketrans({**{c: None for c in _DIACRITICS}, **_FOLDS})
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_arabic(text):
+    """
+    Fold ``text`` to its search form: presentation forms decomposed (NFKC),
+    diacritics and tatweel removed, alef/hamza/ya/ta marbuta variants folded,
+    whitespace collapsed and Latin text casefolded.
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    text = text.translate(_TRANSLATION)
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+
+def chunk_search_text(kitab_name, author, content_arabic):
+    """Normalized text a TextChunk is keyword-searched by."""
+    return normalize_arabic(' '.join(part for part in (kitab_name, author, content_arabic) if part))
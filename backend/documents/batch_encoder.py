@@ -0,0 +1,118 @@
+"""
+Micro-batching front-end for query encoding.
+
+Concurrent search requests each used to call ``model.encode(query)`` on the
+same CPU-bound model, so they serialised behind one another. Requests now hand
+their query to a per-model background thread which collects whatever arrives
+within a short window (up to a maximum batch size) and encodes it in a single
+batched forward pass, then hands each vector back to its waiting request.
+
+Batching only helps when one process serves requests concurrently (threaded
+gunicorn workers or the ASGI app); with one request per process the window
+is the only cost, so keep it small.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .model_registry import get_model
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchEncoder:
+    """Collects concurrent ``encode`` calls into batched model forward passes."""
+
+    def __init__(self, model_name, window_ms=5, max_batch_size=32):
+        self.model_name = model_name
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self.batches = 0
+        self.encoded = 0
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so a forked worker starts its own
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(
+                target=self._run, name=f"batch-encoder-{self.model_name}", daemon=True
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def submit(self, text):
+        """Queue ``text`` for encoding and return a Future for its vector."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text, timeout=30):
+        """Encode one text, sharing a forward pass with concurrent callers."""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Identical concurrent queries share one slot in the forward pass
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = get_model(self.model_name).encode(texts, batch_size=len(texts))
+            except Exception as e:
+                logger.error(f"Batched encode of {len(texts)} queries failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            by_text = dict(zip(texts, vectors))
+            for text, future in batch:
+                future.set_result(by_text[text])
+            self.batches += 1
+            self.encoded += len(texts)
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_batch_encoder(model_name):
+    """Return the process-wide micro-batching encoder for ``model_name``."""
+    encoder = _encoders.get(model_name)
+    if encoder is None:
+        with _encoders_lock:
+            encoder = _encoders.get(model_name)
+            if encoder is None:
+                encoder = MicroBatchEncoder(
+                    model_name,
+                    window_ms=settings.QUERY_BATCH_WINDOW_MS,
+                    max_batch_size=settings.QUERY_BATCH_MAX_SIZE,
+                )
+                _encoders[model_name] = encoder
+    return encoder
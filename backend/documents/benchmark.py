@@ -0,0 +1,203 @@
+"""
+Building blocks of the search benchmark suite (``manage.py benchmark_search``).
+
+* ``synthetic_embeddings`` generates N random unit vectors block by block, so
+  corpora of several million rows only cost the final float32 matrix.
+* ``SyntheticChunks`` is a lazy sequence of chunk dicts with Arabic-like text,
+  derived from the chunk number on access instead of being held in memory.
+* ``StubEncoder`` is a deterministic stand-in for the sentence-transformer:
+  known texts (the benchmark queries) map to a noisy copy of an anchor
+  vector, so queries have real neighbours; any other text maps to a vector
+  seeded by its hash. No model download, and every run is reproducible.
+* ``per_chunk_search`` is the original per-chunk JSON scoring loop, kept as
+  the brute-force baseline.
+* ``time_queries`` / ``latency_summary`` measure p50/p95/p99 latency and QPS.
+"""
+
+import hashlib
+import time
+
+import numpy as np
+
+from .embedding_index import normalize_rows, normalize_vector
+
+ARABIC_LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+# Synthetic rows generated per block
+BLOCK_ROWS = 65536
+
+
+def synthetic_embeddings(n_rows, dim, seed=0, clusters=0, spread=1.0, block_rows=BLOCK_ROWS):
+    """
+    ``(n_rows, dim)`` float32 matrix of random unit vectors.
+
+    With ``clusters`` the rows are scattered around that many random centres
+    (noise of norm ~``spread`` relative to the unit centre), which is closer to
+    real sentence embeddings than uniform noise, where no index structure
+    can help.
+    """
+    rng = np.random.default_rng(seed)
+    centres = normalize_rows(rng.standard_normal((clusters, dim), dtype=np.float32)) if clusters else None
+    matrix = np.empty((n_rows, dim), dtype=np.float32)
+    for start in range(0, n_rows, block_rows):
+        stop = min(start + block_rows, n_rows)
+        block = rng.standard_normal((stop - start, dim), dtype=np.float32)
+        if centres is not None:
+            block *= spread / np.sqrt(dim)
+            block += centres[rng.integers(0, clusters, stop - start)]
+        matrix[start:stop] = normalize_rows(block)
+    return matrix
+
+
+def arabic_like_text(rng, n_words, vocabulary=None):
+    """``n_words`` of random Arabic letters, or words drawn from ``vocabulary``."""
+    if vocabulary is not None:
+        return ' '.join(vocabulary[i] for i in rng.integers(0, len(vocabulary), n_words))
+    letters = np.array(list(ARABIC_LETTERS))
+    lengths = rng.integers(2, 8, n_words)
+    return ' '.join(''.join(rng.choice(letters, length)) for length in lengths)
+
+
+def synthetic_vocabulary(size=5000, seed=0):
+    """Fixed word list, so texts share words and keyword search has matches."""
+    rng = np.random.default_rng(seed)
+    return arabic_like_text(rng, size).split()
+
+
+class SyntheticChunks:
+    """
+    Read-only sequence of ``n`` synthetic chunk dicts, built on access.
+
+    Chunk ``i`` is a pure function of ``(seed, i)``, so the same corpus can be
+    regenerated for any backend without keeping its text in memory.
+    """
+
+    def __init__(self, n, seed=0, words=40, n_kitabs=200, vocabulary=None):
+        self.n = n
+        self.seed = seed
+        self.words = words
+        self.n_kitabs = max(1, min(n_kitabs, n))
+        self.vocabulary = vocabulary if vocabulary is not None else synthetic_vocabulary(seed=seed)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.n))]
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        rng = np.random.default_rng((self.seed, i))
+        kitab = i % self.n_kitabs
+        return {
+            'id': f'synthetic-{i}',
+            'kitab_name': f'كتاب {kitab}',
+            'author': f'مؤلف {kitab % 50}',
+            'content_arabic': arabic_like_text(rng, self.words, self.vocabulary),
+            'chunk_index': i // self.n_kitabs,
+            'metadata': {'synthetic': True},
+        }
+
+
+class StubEncoder:
+    """
+    Deterministic SentenceTransformer stand-in.
+
+    ``anchors`` maps texts to vectors; those texts encode to the anchor plus
+    ``noise`` times a hash-seeded random direction. Other texts encode to a
+    random unit vector seeded by the text's hash.
+    """
+
+    def __init__(self, dim, anchors=None, noise=0.3):
+        self.dim = dim
+        self.anchors = anchors or {}
+        self.noise = noise
+
+    def _hash_vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        return normalize_vector(np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32))
+
+    def _encode_one(self, text):
+        vector = self._hash_vector(text)
+        anchor = self.anchors.get(text)
+        if anchor is not None:
+            vector = normalize_vector(np.asarray(anchor, dtype=np.float32) + self.noise * vector)
+        return vector.astype(np.float32)
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(text) for text in sentences])
+
+
+def per_chunk_search(chunks_data, query_embedding, limit, threshold):
+    """
+    The original JSON search: one cosine similarity per chunk dict in a Python
+    loop over ``embedding`` lists. Kept as the brute-force baseline.
+    """
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        def cosine_similarity(a, b):
+            return a @ b.T / (np.linalg.norm(a) * np.linalg.norm(b))
+
+    results = []
+    for chunk in chunks_data:
+        chunk_embedding = np.array(chunk['embedding'])
+        similarity = cosine_similarity(
+            query_embedding.reshape(1, -1),
+            chunk_embedding.reshape(1, -1)
+        )[0][0]
+        if similarity >= threshold:
+            results.append((chunk['id'], float(similarity)))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:limit]
+
+
+def sample_query_rows(n_rows, n_queries, seed=0):
+    """Corpus rows whose text is used as the benchmark queries."""
+    rng = np.random.default_rng(seed + 1)
+    return rng.choice(n_rows, size=min(n_queries, n_rows), replace=False)
+
+
+def time_queries(search, queries, warmup=3):
+    """
+    Run ``search(query)`` for each query after ``warmup`` untimed calls.
+
+    Returns ``(latencies_in_seconds, results)``.
+    """
+    for query in queries[:warmup]:
+        search(query)
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def latency_summary(latencies):
+    """p50/p95/p99/mean latency in milliseconds and sequential QPS."""
+    samples = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    total_seconds = samples.sum() / 1000
+    return {
+        'queries': int(samples.size),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(samples.mean()), 3),
+        'max_ms': round(float(samples.max()), 3),
+        'qps': round(samples.size / total_seconds, 2) if total_seconds > 0 else None,
+    }
+
+
+def recall_at_k(results, exact_results):
+    """Mean overlap of each result list with the exact top-k for the same query."""
+    recalls = []
+    for found, expected in zip(results, exact_results):
+        expected = set(expected)
+        if expected:
+            recalls.append(len(expected & set(found)) / len(expected))
+    return round(float(np.mean(recalls)), 4) if recalls else None
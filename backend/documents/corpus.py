@@ -0,0 +1,389 @@
+"""
+Hot-reloadable JSON search corpus.
+
+The corpus written by ``process_kitabs_standalone.py`` (the embedding store or
+the legacy ``kitabs_embeddings.json``, plus ``kitabs_search_index.json``) is
+held as a ``CorpusGeneration``. A ``CorpusManager`` watches the files'
+version (the store manifest is written last, so it changes only once a new
+store is complete), loads a new generation in a background thread while the
+current one keeps serving, and swaps the reference under a lock.
+
+Searches ``acquire()`` a lease on the current generation. A replaced
+generation is retired and its matrices and indexes are released once its
+last lease is closed, so in-flight requests finish on the data they started
+with and no worker restart is needed.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from . import ann_index, quantization
+from .corpus_stats import search_index_statistics, statistics_etag
+from .embedding_index import ChunkEmbeddingIndex
+from .embedding_store import open_embedding_store, store_exists, store_paths
+
+logger = logging.getLogger(__name__)
+
+LEGACY_CHUNKS_FILE = 'kitabs_embeddings.json'
+SEARCH_INDEX_FILE = 'kitabs_search_index.json'
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def corpus_version(data_dir):
+    """
+    Cheap on-disk version of the corpus in ``data_dir``, or None when there
+    is no corpus. Changes whenever a new generation has been written.
+    """
+    data_dir = Path(data_dir)
+    if store_exists(data_dir):
+        chunks_version = ('store', _file_version(store_paths(data_dir)[0]))
+    else:
+        legacy_version = _file_version(data_dir / LEGACY_CHUNKS_FILE)
+        if legacy_version is None:
+            return None
+        chunks_version = ('json', legacy_version)
+    return chunks_version + (_file_version(data_dir / SEARCH_INDEX_FILE),)
+
+
+def corpus_size(data_dir):
+    """Bytes on disk of the corpus files in ``data_dir`` (0 when there is none)."""
+    data_dir = Path(data_dir)
+    paths = list(store_paths(data_dir)) if store_exists(data_dir) else [data_dir / LEGACY_CHUNKS_FILE]
+    paths.append(data_dir / SEARCH_INDEX_FILE)
+    return sum(version[1] for version in map(_file_version, paths) if version is not None)
+
+
+class CorpusGeneration:
+    """One loaded version of the corpus and the indexes derived from it."""
+
+    def __init__(self, number, data_dir, chunk_index, fingerprint, search_index=None, version=None):
+        self.number = number
+        self.data_dir = Path(data_dir)
+        self.chunk_index = chunk_index
+        self.fingerprint = fingerprint
+        self.search_index = search_index
+        self.version = version
+        self.loaded_at = time.time()
+        self._ann_index = None
+        self._ann_build = None
+        self._ann_error = None
+        self._quantized_index = None
+        self._quantized_build = None
+        self._quantized_error = None
+        self._statistics = None
+        self._index_lock = threading.Lock()
+        self.leases = 0
+        self.retired = False
+
+    @classmethod
+    def load(cls, number, data_dir):
+        """
+        Load the corpus in ``data_dir``. The memory-mapped binary store is
+        preferred; the legacy JSON file is only parsed when no store exists.
+        Returns None when there is no corpus.
+        """
+        data_dir = Path(data_dir)
+        version = corpus_version(data_dir)
+        if version is None:
+            logger.warning(f"No search corpus found in {data_dir}")
+            return None
+
+        if store_exists(data_dir):
+            embeddings, chunks, manifest = open_embedding_store(data_dir)
+            chunk_index = ChunkEmbeddingIndex(embeddings, chunks, normalized=True)
+            fingerprint = f"store:{manifest['count']}:{manifest['created_at']}"
+        else:
+            json_file = data_dir / LEGACY_CHUNKS_FILE
+            with open(json_file, 'r', encoding='utf-8') as f:
+                chunks_data = json.load(f)
+            chunk_index = ChunkEmbeddingIndex.from_chunks(chunks_data)
+            fingerprint = f"json:{len(chunk_index)}:{json_file.stat().st_mtime_ns}"
+
+        search_index = None
+        index_file = data_dir / SEARCH_INDEX_FILE
+        if index_file.exists():
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    search_index = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading search index {index_file}: {e}")
+
+        logger.info(
+            f"Loaded corpus generation {number}: {len(chunk_index)} chunks x "
+            f"{chunk_index.dimensions} dims ({fingerprint})"
+        )
+        return cls(number, data_dir, chunk_index, fingerprint, search_index, version)
+
+    @property
+    def chunks(self):
+        return self.chunk_index.chunks
+
+    def __len__(self):
+        return len(self.chunk_index)
+
+    def ann_index(self):
+        """
+        The IVF approximate index persisted next to the corpus, or None while
+        it is being loaded or built. A missing or stale index is trained in a
+        background thread (k-means takes seconds to minutes), so no request
+        waits for it; callers search exactly in the meantime.
+        """
+        # The lock only guards the index reference and the build thread;
+        # loading and training run without it
+        with self._index_lock:
+            building = self._ann_build is not None and self._ann_build.is_alive()
+            if self._ann_index is None and not building and self._ann_error is None:
+                self._ann_build = threading.Thread(
+                    target=self._build_ann_index,
+                    args=(self.data_dir / "kitabs_ivf.npz", self.chunk_index.matrix),
+                    name=f'ann-index-{self.number}',
+                    daemon=True,
+                )
+                self._ann_build.start()
+            return self._ann_index
+
+    def _build_ann_index(self, path, matrix):
+        try:
+            index = ann_index.load_or_build(path, matrix, self.fingerprint)
+        except Exception as e:
+            logger.error(f"Building the ANN index of generation {self.number} failed: {e}")
+            self._ann_error = str(e)
+            return
+        with self._index_lock:
+            if self.chunk_index is not None:  # not released meanwhile
+                self._ann_index = index
+
+    def quantized_index(self):
+        """
+        The quantized codes persisted next to the corpus, with recall@10
+        measured against exact search on sampled queries, or None while they
+        are loaded or built and measured in a background thread. Also None
+        when recall is below ``QUANTIZED_RECALL_FLOOR``; callers search
+        exactly in both cases.
+        """
+        with self._index_lock:
+            index = self._quantized_index
+            building = self._quantized_build is not None and self._quantized_build.is_alive()
+            if index is None and not building and self._quantized_error is None:
+                self._quantized_build = threading.Thread(
+                    target=self._build_quantized_index,
+                    args=(self.chunk_index,),
+                    name=f'quantized-index-{self.number}',
+                    daemon=True,
+                )
+                self._quantized_build.start()
+        if index is None or index.recall is not None and index.recall < settings.QUANTIZED_RECALL_FLOOR:
+            return None
+        return index
+
+    def _build_quantized_index(self, chunk_index):
+        kind = settings.QUANTIZATION_KIND
+        try:
+            index = quantization.load_or_build(
+                self.data_dir / f"kitabs_{kind}.npz",
+                chunk_index.matrix,
+                self.fingerprint,
+                kind=kind,
+                rescore_factor=settings.QUANTIZED_RESCORE_FACTOR,
+            )
+            queries = quantization.sample_queries(chunk_index.matrix)
+            index.recall = quantization.measure_recall(index, chunk_index, queries)
+        except Exception as e:
+            logger.error(f"Building the quantized index of generation {self.number} failed: {e}")
+            self._quantized_error = str(e)
+            return
+        logger.info(f"Quantized index ready: {index.memory_stats()}")
+        if index.recall is not None and index.recall < settings.QUANTIZED_RECALL_FLOOR:
+            logger.warning(
+                f"Quantized recall@10 {index.recall:.3f} is below the floor "
+                f"{settings.QUANTIZED_RECALL_FLOOR}, mode=quantized will search exactly"
+            )
+        with self._index_lock:
+            if self.chunk_index is not None:  # not released meanwhile
+                self._quantized_index = index
+
+    def quantized_stats(self):
+        return self._quantized_index.memory_stats() if self._quantized_index is not None else None
+
+    @property
+    def statistics_etag(self):
+        return statistics_etag('corpus', self.fingerprint, self.version)
+
+    def statistics(self):
+        """Per-kitab and per-author statistics, built once per generation."""
+        if self._statistics is None:
+            self._statistics = search_index_statistics(self.search_index, len(self))
+        return self._statistics
+
+    def release(self):
+        """Drop the matrices and indexes (unmapping the store)."""
+        self.chunk_index = None
+        self.search_index = None
+        self._ann_index = None
+        self._quantized_index = None
+        self._statistics = None
+        logger.info(f"Released corpus generation {self.number}")
+
+
+class CorpusLease:
+    """Keeps a generation alive until closed; usable as a context manager."""
+
+    def __init__(self, manager, generation):
+        self._manager = manager
+        self.generation = generation
+        self._closed = generation is None
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._manager._release(self.generation)
+
+    def __enter__(self):
+        return self.generation
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CorpusManager:
+    """Owns the current corpus generation and replaces it when files change."""
+
+    def __init__(self, data_dir, reload_interval=30):
+        self.data_dir = Path(data_dir)
+        self.reload_interval = reload_interval
+        self._current = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._generations = 0
+        self._watcher = None
+        self._watcher_pid = None
+        self.last_error = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def acquire(self):
+        """
+        Lease the current generation, loading the first one synchronously if
+        nothing has been loaded yet. ``lease.generation`` is None when there
+        is no corpus.
+        """
+        self._ensure_watcher()
+        if self._current is None:
+            self.reload()
+        with self._lock:
+            generation = self._current
+            if generation is not None:
+                generation.leases += 1
+        return CorpusLease(self, generation)
+
+    def _release(self, generation):
+        with self._lock:
+            generation.leases -= 1
+            release = generation.retired and generation.leases == 0
+        if release:
+            generation.release()
+
+    def reload(self, force=False):
+        """
+        Load the corpus on disk if its version differs from the current
+        generation (or ``force``), then swap it in. Returns True on a swap.
+        Concurrent callers wait for the load already in progress.
+        """
+        with self._load_lock:
+            current = self._current
+            version = corpus_version(self.data_dir)
+            if not force and current is not None and version == current.version:
+                return False
+            if version is None:
+                return False
+            try:
+                generation = CorpusGeneration.load(self._generations + 1, self.data_dir)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error loading search corpus from {self.data_dir}: {e}")
+                return False
+            if generation is None:
+                return False
+            self._generations = generation.number
+            self.last_error = None
+            self._swap(generation)
+            return True
+
+    def _swap(self, generation):
+        with self._lock:
+            previous, self._current = self._current, generation
+            release = False
+            if previous is not None:
+                previous.retired = True
+                release = previous.leases == 0
+        if previous is not None:
+            logger.info(
+                f"Swapped corpus generation {previous.number} -> {generation.number}"
+                f" ({previous.leases} searches still on the old one)"
+            )
+            if release:
+                previous.release()
+
+    def _ensure_watcher(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if not self.reload_interval:
+            return
+        if self._watcher_pid == os.getpid() and self._watcher.is_alive():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid() and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(target=self._watch, name='corpus-watcher', daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Corpus watcher error: {e}")
+
+    def stats(self):
+        generation = self._current
+        return {
+            'generation': generation.number if generation else None,
+            'fingerprint': generation.fingerprint if generation else None,
+            'loaded_at': generation.loaded_at if generation else None,
+            'active_searches': generation.leases if generation else 0,
+            'reload_interval': self.reload_interval,
+            'last_error': self.last_error,
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_corpus_manager():
+    """Return the process-wide corpus manager configured from settings."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = CorpusManager(
+                    settings.SEMANTIC_SEARCH_DATA_DIR,
+                    reload_interval=settings.SEMANTIC_SEARCH_RELOAD_INTERVAL,
+                )
+    return _manager
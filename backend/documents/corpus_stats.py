@@ -0,0 +1,167 @@
+"""
+Precomputed per-kitab and per-author corpus statistics.
+
+Both corpora serve the same statistics payload without scanning chunks per
+request:
+
+* the JSON corpus builds it once per ``CorpusGeneration`` from
+  ``kitabs_search_index.json``;
+* the database keeps ``KitabStatistics`` rows, refreshed for one kitab at a
+  time when its chunks are (re)written by ``process_books``, and after the
+  commit of any other chunk write: saves and document deletes through
+  ``documents.signals``, chunk deletes through the viewset and admin.
+  Queryset deletes of chunks elsewhere must call
+  ``schedule_kitab_statistics_refresh`` themselves.
+
+Each payload has an ETag (the corpus fingerprint, or the version of the
+statistics table), so clients revalidating with ``If-None-Match`` get a
+``304`` without the payload being rebuilt or sent.
+"""
+
+import functools
+import hashlib
+import threading
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import KitabStatistics, TextChunk
+
+# Books listed in the payload, largest first
+TOP_BOOKS = 20
+
+
+def statistics_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def build_statistics(books, authors=None, total_chunks=None):
+    """
+    Statistics payload from ``books`` (``{'name', 'author', 'chunk_count'}``
+    dicts). ``authors`` (``{'name', 'book_count', 'chunk_count'}``) is
+    derived from the books when not given.
+    """
+    books = sorted(books, key=lambda x: x['chunk_count'], reverse=True)
+    if authors is None:
+        by_author = {}
+        for book in books:
+            entry = by_author.setdefault(
+                book['author'], {'name': book['author'], 'book_count': 0, 'chunk_count': 0}
+            )
+            entry['book_count'] += 1
+            entry['chunk_count'] += book['chunk_count']
+        authors = by_author.values()
+    authors = sorted(authors, key=lambda x: x['chunk_count'], reverse=True)
+    return {
+        'total_chunks': total_chunks if total_chunks is not None else sum(b['chunk_count'] for b in books),
+        'total_books': len(books),
+        'total_authors': len(authors),
+        'data_available': True,
+        'books': books[:TOP_BOOKS],
+        'authors': authors,
+    }
+
+
+def search_index_statistics(search_index, total_chunks):
+    """Statistics payload from a ``kitabs_search_index.json`` document."""
+    search_index = search_index or {}
+    books = [
+        {
+            'name': book_name,
+            'author': book_data.get('author', 'Unknown'),
+            'chunk_count': book_data.get('chunk_count', 0)
+        }
+        for book_name, book_data in search_index.get('books', {}).items()
+    ]
+    authors = [
+        {
+            'name': author_name,
+            'book_count': len(author_data.get('books', [])),
+            'chunk_count': author_data.get('chunk_count', 0)
+        }
+        for author_name, author_data in search_index.get('authors', {}).items()
+    ]
+    return build_statistics(books, authors, total_chunks=total_chunks)
+
+
+def refresh_kitab_statistics(kitab_name, author):
+    """Recount one kitab's chunks into its ``KitabStatistics`` row."""
+    chunk_count = TextChunk.objects.filter(kitab_name=kitab_name, author=author).count()
+    if chunk_count:
+        KitabStatistics.objects.update_or_create(
+            kitab_name=kitab_name, author=author, defaults={'chunk_count': chunk_count}
+        )
+    else:
+        KitabStatistics.objects.filter(kitab_name=kitab_name, author=author).delete()
+    return chunk_count
+
+
+_pending = threading.local()
+
+
+def _refresh_pending(pair):
+    pending = _pending.pairs
+    if pair in pending:
+        pending.discard(pair)
+        refresh_kitab_statistics(*pair)
+
+
+def schedule_kitab_statistics_refresh(pairs):
+    """
+    Recount the ``(kitab_name, author)`` ``pairs`` once the current
+    transaction commits (immediately outside one). A kitab is recounted once
+    per commit however many of its chunks changed; after a rollback nothing
+    is recounted.
+    """
+    if not hasattr(_pending, 'pairs'):
+        _pending.pairs = set()
+    for pair in pairs:
+        pair = tuple(pair)
+        _pending.pairs.add(pair)
+        transaction.on_commit(functools.partial(_refresh_pending, pair))
+
+
+def database_statistics_etag():
+    """Version of the statistics table: one aggregate over its (few) rows."""
+    version = KitabStatistics.objects.aggregate(
+        rows=Count('id'), chunks=Sum('chunk_count'), updated=Max('updated_at')
+    )
+    return statistics_etag('db', version['rows'], version['chunks'], version['updated'])
+
+
+_database_payload = (None, None)
+_database_lock = threading.Lock()
+
+
+def database_statistics(etag):
+    """Statistics payload from ``KitabStatistics``, rebuilt only when ``etag`` changes."""
+    global _database_payload
+    cached_etag, payload = _database_payload
+    if cached_etag == etag:
+        return payload
+    with _database_lock:
+        books = [
+            {'name': name, 'author': author, 'chunk_count': chunk_count}
+            for name, author, chunk_count in KitabStatistics.objects.values_list(
+                'kitab_name', 'author', 'chunk_count'
+            )
+        ]
+        payload = build_statistics(books)
+        _database_payload = (etag, payload)
+    return payload
+
+
+def conditional_response(request, etag, build_payload):
+    """
+    ``304 Not Modified`` when the client already holds ``etag``, otherwise
+    the payload from ``build_payload()``; both carry the ETag.
+    """
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in client_etags or '*' in client_etags:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(build_payload(), status=status.HTTP_200_OK, headers=headers)
@@ -0,0 +1,171 @@
+"""
+Vectorized embedding index for chunk semantic search.
+
+Chunk embeddings are held in one contiguous, L2-normalised float32 matrix so a
+query is scored against the whole corpus with a single matrix-vector product
+instead of one cosine similarity call per chunk.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Corpus rows scored per matrix product in ``search_many``, so the score
+# matrix stays (n_queries x SEARCH_BLOCK_ROWS) however large the corpus is
+SEARCH_BLOCK_ROWS = 32768
+
+
+def normalize_rows(matrix):
+    """L2-normalise the rows of ``matrix`` in place, leaving zero rows untouched."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_vector(vector):
+    """Return ``vector`` as a float32 unit vector."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return vector
+    return vector / norm
+
+
+def top_k(scores, limit, threshold):
+    """
+    Select the indices of the ``limit`` best scores that are >= ``threshold``.
+
+    Threshold filtering is done on the score vector first, then ``argpartition``
+    picks the top-k candidates so only k elements are fully sorted.
+    """
+    if limit <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    candidates = np.flatnonzero(scores >= threshold)
+    if candidates.size > limit:
+        best = np.argpartition(scores[candidates], -limit)[-limit:]
+        candidates = candidates[best]
+
+    order = np.argsort(-scores[candidates], kind='stable')
+    return candidates[order]
+
+
+class ChunkEmbeddingIndex:
+    """In-memory cosine similarity index over text chunk embeddings."""
+
+    def __init__(self, embeddings, chunks, normalized=False):
+        """
+        Args:
+            embeddings: 2-D array-like of shape (n_chunks, dim).
+            chunks: Sequence of chunk metadata dicts aligned with ``embeddings``.
+            normalized: Set when the rows are already unit length, so the
+                matrix can be used as-is (e.g. a read-only memory map).
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a 2-D embedding matrix, got shape {matrix.shape}")
+        if len(chunks) != matrix.shape[0]:
+            raise ValueError(
+                f"Chunk metadata ({len(chunks)}) and embeddings ({matrix.shape[0]}) are not aligned"
+            )
+
+        if not normalized:
+            matrix = normalize_rows(np.array(matrix, dtype=np.float32, order='C', copy=True))
+        elif not matrix.flags['C_CONTIGUOUS']:
+            matrix = np.ascontiguousarray(matrix)
+
+        self.matrix = matrix
+        self.chunks = chunks
+
+    @classmethod
+    def from_chunks(cls, chunks_data):
+        """
+        Build an index from chunk dicts carrying an ``embedding`` list.
+
+        The embedding lists are popped from the dicts as they are copied into the
+        matrix, so the per-float Python objects can be garbage collected.
+        Chunks with a missing or mis-sized embedding are skipped.
+        """
+        if not chunks_data:
+            return cls(np.empty((0, 0), dtype=np.float32), [])
+
+        dim = None
+        for chunk in chunks_data:
+            if chunk.get('embedding'):
+                dim = len(chunk['embedding'])
+                break
+        if dim is None:
+            return cls(np.empty((0, 0), dtype=np.float32), [])
+
+        matrix = np.empty((len(chunks_data), dim), dtype=np.float32)
+        chunks = []
+        for chunk in chunks_data:
+            embedding = chunk.pop('embedding', None)
+            if embedding is None or len(embedding) != dim:
+                logger.warning(f"Skipping chunk {chunk.get('id', 'unknown')}: invalid embedding")
+                continue
+            matrix[len(chunks)] = embedding
+            chunks.append(chunk)
+
+        return cls(normalize_rows(matrix[:len(chunks)]), chunks, normalized=True)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dimensions(self):
+        return self.matrix.shape[1]
+
+    def scores(self, query_embedding):
+        """Cosine similarity of ``query_embedding`` against every chunk."""
+        return self.matrix @ normalize_vector(query_embedding)
+
+    def search(self, query_embedding, limit=10, threshold=0.0):
+        """
+        Rank chunks against ``query_embedding``.
+
+        Returns:
+            A ``(indices, scores)`` pair of arrays ordered by descending score.
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.scores(query_embedding)
+        indices = top_k(scores, limit, threshold)
+        return indices, scores[indices]
+
+    def search_many(self, query_embeddings, limits, thresholds, block_rows=SEARCH_BLOCK_ROWS):
+        """
+        Rank chunks against several queries, one matrix-matrix product per
+        block of ``block_rows`` chunks. Each query's top-k of a block is
+        merged into its running top-k, so memory is bounded by the block
+        size and the limits rather than by ``n_queries * n_chunks``.
+
+        Args:
+            query_embeddings: (n_queries, dim) array-like.
+            limits, thresholds: Per-query sequences aligned with the queries.
+
+        Returns:
+            One ``(indices, scores)`` pair per query, as returned by ``search``.
+        """
+        queries = normalize_rows(np.array(query_embeddings, dtype=np.float32, ndmin=2))
+        best = [
+            (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            for _ in range(queries.shape[0])
+        ]
+        for start in range(0, len(self), block_rows):
+            # (n_queries, block_rows): each row is contiguous for top_k
+            scores = queries @ self.matrix[start:start + block_rows].T
+            for q, (row, limit, threshold) in enumerate(zip(scores, limits, thresholds)):
+                indices = top_k(row, limit, threshold)
+                if not indices.size:
+                    continue
+                # Earlier blocks first, so equal scores keep corpus order
+                merged_indices = np.concatenate([best[q][0], indices + start])
+                merged_scores = np.concatenate([best[q][1], row[indices]])
+                keep = top_k(merged_scores, limit, threshold)
+                best[q] = (merged_indices[keep], merged_scores[keep])
+        return best
@@ -0,0 +1,199 @@
+"""
+Binary, memory-mapped embedding store for the JSON search corpus.
+
+A store is three files sharing a name prefix inside one directory:
+
+- ``<name>_embeddings.<generation>.npy``: float32 (n_chunks, dim) matrix of
+  L2-normalised embeddings, opened read-only with ``np.memmap`` so every
+  worker on a node shares the same page cache instead of holding a private
+  copy.
+- ``<name>_chunks.<generation>.json``: chunk metadata (everything except the
+  embedding), aligned row-for-row with the matrix.
+- ``<name>_store.json``: manifest naming the data files of the current
+  generation.
+
+Every write puts its data files under new names and then replaces the
+manifest in one ``os.replace``, the only switch between generations: a
+reader opening the store at any moment sees either the old files or the new
+ones, never one of each. The previous generation is kept for readers that
+read the old manifest just before the switch; older ones are deleted.
+Stores written before generations existed (unversioned data file names) are
+still read.
+
+This module only depends on numpy so ``process_kitabs_standalone.py`` can use
+it without configuring Django.
+"""
+
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+STORE_FORMAT_VERSION = 1
+DEFAULT_STORE_NAME = 'kitabs'
+
+
+def store_paths(directory, name=DEFAULT_STORE_NAME, generation=None):
+    """
+    Return the (manifest, embeddings, chunks) paths of a store: those of
+    ``generation`` if given, otherwise those named by the current manifest
+    (the unversioned names when there is none).
+    """
+    directory = Path(directory)
+    manifest_path = directory / f"{name}_store.json"
+    if generation is not None:
+        return (
+            manifest_path,
+            directory / f"{name}_embeddings.{generation}.npy",
+            directory / f"{name}_chunks.{generation}.json",
+        )
+    manifest = _read_manifest(manifest_path)
+    if manifest is None:
+        return (
+            manifest_path,
+            directory / f"{name}_embeddings.npy",
+            directory / f"{name}_chunks.json",
+        )
+    return (
+        manifest_path,
+        directory / manifest['embeddings_file'],
+        directory / manifest['chunks_file'],
+    )
+
+
+def store_exists(directory, name=DEFAULT_STORE_NAME):
+    return (Path(directory) / f"{name}_store.json").exists()
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_json_atomic(path, data, indent=None):
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _remove_old_generations(directory, name, keep):
+    """Delete store data files other than ``keep`` (file names)."""
+    directory = Path(directory)
+    for pattern in (f"{name}_embeddings*.npy", f"{name}_chunks*.json"):
+        for path in directory.glob(pattern):
+            if path.name not in keep:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+
+def write_embedding_store(chunks, directory, name=DEFAULT_STORE_NAME, model_name=None):
+    """
+    Write chunk dicts carrying an ``embedding`` to a binary store.
+
+    Embeddings are normalised and streamed row by row into a memory-mapped
+    ``.npy`` file, so peak memory stays close to the size of the input.
+    Chunks without an embedding are skipped.
+
+    Returns:
+        The manifest dict that was written.
+    """
+    chunks = [chunk for chunk in chunks if chunk.get('embedding') is not None]
+    if not chunks:
+        raise ValueError("No chunks with embeddings to write")
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    generation = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    manifest_path, embeddings_path, chunks_path = store_paths(directory, name, generation)
+    previous = _read_manifest(manifest_path)
+
+    dim = len(chunks[0]['embedding'])
+    matrix = np.lib.format.open_memmap(
+        embeddings_path, mode='w+', dtype=np.float32, shape=(len(chunks), dim)
+    )
+    metadata = []
+    for row, chunk in enumerate(chunks):
+        vector = np.asarray(chunk['embedding'], dtype=np.float32)
+        if vector.shape != (dim,):
+            raise ValueError(
+                f"Chunk {chunk.get('id', row)} has {vector.size} dims, expected {dim}"
+            )
+        norm = np.linalg.norm(vector)
+        matrix[row] = vector / norm if norm else vector
+        metadata.append({key: value for key, value in chunk.items() if key != 'embedding'})
+    matrix.flush()
+    del matrix
+
+    _write_json_atomic(chunks_path, metadata)
+
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'generation': generation,
+        'count': len(metadata),
+        'dimensions': dim,
+        'dtype': 'float32',
+        'normalized': True,
+        'model_name': model_name,
+        'embeddings_file': embeddings_path.name,
+        'chunks_file': chunks_path.name,
+        'created_at': datetime.now().isoformat(),
+    }
+    _write_json_atomic(manifest_path, manifest, indent=2)
+
+    keep = {embeddings_path.name, chunks_path.name}
+    if previous is not None:
+        keep.update((previous.get('embeddings_file'), previous.get('chunks_file')))
+    _remove_old_generations(directory, name, keep)
+    return manifest
+
+
+def open_embedding_store(directory, name=DEFAULT_STORE_NAME):
+    """
+    Open a store for reading.
+
+    Returns:
+        ``(embeddings, chunks, manifest)`` where ``embeddings`` is a read-only
+        ``np.memmap`` of normalised float32 rows.
+    """
+    manifest_path = Path(directory) / f"{name}_store.json"
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format_version') != STORE_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported embedding store version {manifest.get('format_version')} in {manifest_path}"
+        )
+
+    directory = Path(directory)
+    embeddings = np.load(directory / manifest['embeddings_file'], mmap_mode='r')
+    with open(directory / manifest['chunks_file'], 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+
+    if embeddings.shape[0] != len(chunks):
+        raise ValueError(
+            f"Embedding store {manifest_path} is inconsistent: "
+            f"{embeddings.shape[0]} rows, {len(chunks)} chunks"
+        )
+    return embeddings, chunks, manifest
+
+
+def convert_json_to_store(json_file, directory, name=DEFAULT_STORE_NAME, model_name=None):
+    """Convert a legacy ``kitabs_embeddings.json`` file into a binary store."""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    return write_embedding_store(chunks, directory, name=name, model_name=model_name)
@@ -0,0 +1,169 @@
+"""
+Per-page routing between a PDF's embedded text layer and OCR.
+
+Kitab PDFs are often mixed: digital pages with a good text layer next to
+scanned pages with none, or with a broken one (fonts without a Unicode map
+produce private-use or Latin-1 garbage). Deciding for the whole document
+either OCRs good pages for nothing or keeps garbage and loses the scans.
+``score_text_layer`` rates each page's extracted text on its length, the
+share of letters, the share of Arabic script and mojibake markers, and only
+pages scoring below ``TEXT_LAYER_MIN_SCORE`` are rasterized and OCRed.
+"""
+
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+
+from .ocr import get_ocr_engine, pdf_page_count
+
+logger = logging.getLogger(__name__)
+
+# UTF-8 Arabic decoded as Latin-1/CP1252 starts every letter with one of these
+_MOJIBAKE_LEAD = re.compile(
+    r'[\u00d8-\u00db][\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192'
+    r'\u02c6\u02dc\u2013-\u203a\u20ac\u2122]'
+)
+# Text layers that lost their word order come out one letter per "word"
+_SINGLE_LETTER_WORD = re.compile(r'(?<!\S)\w(?!\S)')
+
+
+def _is_arabic(char):
+    code = ord(char)
+    return (
+        0x0600 <= code <= 0x06FF or 0x0750 <= code <= 0x077F
+        or 0x08A0 <= code <= 0x08FF or 0xFB50 <= code <= 0xFDFF or 0xFE70 <= code <= 0xFEFF
+    )
+
+
+def _is_suspicious(char):
+    category = unicodedata.category(char)
+    return (
+        char == '\ufffd'
+        or category in ('Co', 'Cs', 'Cn')  # private use, surrogates, unassigned
+        or (category == 'Cc' and char not in '\n\r\t')
+    )
+
+
+def score_text_layer(text, min_chars=None, expect_arabic=False):
+    """
+    Rate the text extracted from one page's text layer.
+
+    Returns a dict of the measurements and a ``score`` in [0, 1]: the
+    product of a length factor (``chars / min_chars``, capped at 1), the
+    share of letters among non-space characters and a mojibake penalty.
+    With ``expect_arabic`` (kitab), pages whose letters are less than half
+    Arabic script are penalized too: Arabic fonts without a Unicode map
+    often extract as Latin letters.
+    """
+    min_chars = min_chars or settings.TEXT_LAYER_MIN_CHARS
+    text = text or ''
+    visible = [c for c in text if not c.isspace()]
+    chars = len(visible)
+    if not chars:
+        return {'chars': 0, 'letter_ratio': 0.0, 'arabic_ratio': 0.0, 'mojibake_ratio': 0.0, 'score': 0.0}
+
+    letters = [c for c in visible if c.isalpha()]
+    arabic = sum(1 for c in letters if _is_arabic(c))
+    suspicious = sum(1 for c in visible if _is_suspicious(c))
+    suspicious += 2 * len(_MOJIBAKE_LEAD.findall(text))
+    words = text.split()
+    single_letter_words = len(_SINGLE_LETTER_WORD.findall(text))
+    if len(words) >= 10 and single_letter_words / len(words) > 0.5:
+        suspicious += single_letter_words
+
+    letter_ratio = len(letters) / chars
+    arabic_ratio = arabic / len(letters) if letters else 0.0
+    mojibake_ratio = min(1.0, suspicious / chars)
+    length_factor = min(1.0, chars / min_chars)
+    # A few percent of garbage already makes the layer unusable for search
+    score = length_factor * letter_ratio * max(0.0, 1 - 10 * mojibake_ratio)
+    if expect_arabic:
+        score *= min(1.0, 2 * arabic_ratio)
+    return {
+        'chars': chars,
+        'letter_ratio': round(letter_ratio, 3),
+        'arabic_ratio': round(arabic_ratio, 3),
+        'mojibake_ratio': round(mojibake_ratio, 3),
+        'score': round(score, 3),
+    }
+
+
+def read_text_layer(pdf_path):
+    """
+    Text of every page's embedded text layer, ``''`` for pages PyPDF2 cannot
+    read. Returns None when the file cannot be opened as a PDF at all.
+    """
+    import PyPDF2
+
+    try:
+        reader = PyPDF2.PdfReader(str(pdf_path))
+        pages = reader.pages
+    except Exception as e:
+        logger.warning(f"Could not read the text layer of {pdf_path}: {e}")
+        return None
+    texts = []
+    for number, page in enumerate(pages, start=1):
+        try:
+            texts.append(page.extract_text() or '')
+        except Exception as e:
+            logger.warning(f"Text layer of page {number} of {pdf_path} is unreadable: {e}")
+            texts.append('')
+    return texts
+
+
+def read_pdf_metadata(pdf_path):
+    """The PDF's document information (``/Title``, ``/Author``, ...) without the slashes."""
+    import PyPDF2
+
+    try:
+        info = PyPDF2.PdfReader(str(pdf_path)).metadata or {}
+    except Exception as e:
+        logger.warning(f"Could not read the metadata of {pdf_path}: {e}")
+        return {}
+    return {key[1:]: str(value) for key, value in info.items() if key.startswith('/')}
+
+
+def extract_pdf_text(pdf_path, lang=None, config='', min_score=None, expect_arabic=False):
+    """
+    Extract a PDF page by page, OCRing only the pages whose text layer
+    scores below ``min_score`` (default ``TEXT_LAYER_MIN_SCORE``).
+    ``expect_arabic`` is passed on to ``score_text_layer``.
+
+    Returns ``(pages, summary)``. Each page is a dict with ``page_number``,
+    ``text``, ``source`` (``'text_layer'`` or ``'ocr'``) and ``quality``
+    (the ``score_text_layer`` result), plus ``ocr_seconds`` when OCRed.
+    """
+    min_score = settings.TEXT_LAYER_MIN_SCORE if min_score is None else min_score
+    layer = read_text_layer(pdf_path)
+    if layer is None:
+        layer = [''] * pdf_page_count(pdf_path)
+
+    pages = []
+    for number, text in enumerate(layer, start=1):
+        quality = score_text_layer(text, expect_arabic=expect_arabic)
+        pages.append({
+            'page_number': number,
+            'text': text,
+            'source': 'text_layer' if quality['score'] >= min_score else 'ocr',
+            'quality': quality,
+        })
+
+    to_ocr = [page['page_number'] for page in pages if page['source'] == 'ocr']
+    timing = None
+    if to_ocr:
+        ocr_pages, timing = get_ocr_engine().ocr_pdf(pdf_path, lang=lang, config=config, pages=to_ocr)
+        for result in ocr_pages:
+            page = pages[result['page_number'] - 1]
+            page['text'] = result['text']
+            page['ocr_seconds'] = result['ocr_seconds']
+
+    summary = {
+        'pages': len(pages),
+        'text_layer_pages': len(pages) - len(to_ocr),
+        'ocr_pages': len(to_ocr),
+        'ocr_timing': timing,
+    }
+    logger.info(f"Extracted {pdf_path}: {summary['text_layer_pages']} text layer pages, {summary['ocr_pages']} OCRed")
+    return pages, summary
@@ -0,0 +1,159 @@
+"""
+Content-addressed cache of extraction results.
+
+The same PDF is often uploaded again, as a new ``DocumentVersion`` or by
+another user, and every upload used to be downloaded and OCRed from scratch.
+``ExtractionCache`` rows keep the per-page text (plus the extraction summary
+and the file's PDF metadata) keyed by the file's SHA-256 and by
+``extraction_config_version``, a hash of everything that changes the output:
+``EXTRACTOR_VERSION``, the kind of file, OCR language and tesseract config
+and the text layer thresholds. The tesseract major.minor version is part of
+the hash for images, which are always OCRed. A PDF may need no OCR at all,
+so its entries record the version only when some page was OCRed, and are
+re-extracted when that version differs from the installed one; patch
+releases and text-layer-only PDFs keep hitting the cache.
+
+``extract_with_cache`` only calls ``fetch`` (download) and the extractor on
+a miss. Bump ``EXTRACTOR_VERSION`` when the extraction code changes its
+output; old rows then simply stop matching.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .extraction import extract_pdf_text, read_pdf_metadata
+from .models import ExtractionCache
+from .ocr import DEFAULT_LANG, get_ocr_engine, timing_summary
+
+logger = logging.getLogger(__name__)
+
+EXTRACTOR_VERSION = 1
+
+KIND_PDF = 'pdf'
+KIND_IMAGE = 'image'
+
+
+def file_checksum(path, block_size=1024 * 1024):
+    """SHA-256 of a file, read in blocks (same digest as ``Document.checksum``)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _tesseract_version():
+    """Major.minor version of the installed tesseract (runs it once per process)."""
+    try:
+        import pytesseract
+        return '.'.join(str(pytesseract.get_tesseract_version()).split('.')[:2])
+    except Exception:
+        return 'unknown'
+
+
+def extraction_config(kind, lang=None, config='', expect_arabic=False):
+    """Everything that changes the extracted text of a ``kind`` file."""
+    parts = {
+        'extractor': EXTRACTOR_VERSION,
+        'kind': kind,
+        'lang': lang or DEFAULT_LANG,
+        'config': config,
+    }
+    if kind == KIND_IMAGE:
+        parts['tesseract'] = _tesseract_version()
+    else:
+        parts.update({
+            'expect_arabic': expect_arabic,
+            'text_layer_min_score': settings.TEXT_LAYER_MIN_SCORE,
+            'text_layer_min_chars': settings.TEXT_LAYER_MIN_CHARS,
+        })
+    return parts
+
+
+def extraction_config_version(parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def lookup(checksum, config_version):
+    """Cached extraction for this content and configuration (``cache_hit`` set), or None."""
+    entry = ExtractionCache.objects.filter(checksum=checksum, config_version=config_version).first()
+    if entry is not None and entry.config.get('tesseract', _tesseract_version()) != _tesseract_version():
+        logger.info(f"Extraction cache entry for {checksum[:12]} was OCRed by another tesseract version")
+        entry = None
+    if entry is not None:
+        ExtractionCache.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1, last_used_at=timezone.now()
+        )
+        entry.cache_hit = True
+        logger.info(f"Extraction cache hit for {checksum[:12]} ({len(entry.pages)} pages)")
+    return entry
+
+
+def _extract(path, kind, lang, config, expect_arabic):
+    if kind == KIND_IMAGE:
+        from PIL import Image
+
+        start = time.perf_counter()
+        with Image.open(path) as image:
+            page = get_ocr_engine().ocr_image(image, lang=lang, config=config)
+        pages = [{**page, 'source': 'ocr'}]
+        summary = {
+            'pages': 1,
+            'text_layer_pages': 0,
+            'ocr_pages': 1,
+            'ocr_timing': timing_summary(pages, time.perf_counter() - start),
+        }
+        return pages, summary, {}
+    pages, summary = extract_pdf_text(path, lang=lang, config=config, expect_arabic=expect_arabic)
+    return pages, summary, read_pdf_metadata(path)
+
+
+def extract_with_cache(checksum, kind, fetch, lang=None, config='', expect_arabic=False):
+    """
+    Per-page extraction of a ``kind`` (``'pdf'`` or ``'image'``) file.
+
+    ``fetch()`` returns a context manager yielding the local path of the
+    file; it is entered only on a cache miss. Without a ``checksum`` the
+    fetched file is hashed and the cache is consulted before extracting.
+
+    Returns an ``ExtractionCache`` instance (unsaved when caching is off or
+    nothing was extracted) with ``cache_hit`` set.
+    """
+    enabled = settings.EXTRACTION_CACHE_ENABLED
+    parts = extraction_config(kind, lang=lang, config=config, expect_arabic=expect_arabic)
+    version = extraction_config_version(parts)
+
+    if enabled and checksum:
+        entry = lookup(checksum, version)
+        if entry is not None:
+            return entry
+
+    with fetch() as path:
+        if not checksum:
+            checksum = file_checksum(path)
+            entry = lookup(checksum, version) if enabled else None
+            if entry is not None:
+                return entry
+        pages, summary, metadata = _extract(path, kind, lang, config, expect_arabic)
+
+    if any(page.get('source') == 'ocr' for page in pages):
+        parts = {**parts, 'tesseract': _tesseract_version()}
+    values = {'config': parts, 'pages': pages, 'summary': summary, 'metadata': metadata}
+    # An empty result is more likely a failed run than a blank file; let the
+    # next attempt extract again instead of serving it from the cache
+    if enabled and any(page['text'].strip() for page in pages):
+        entry, _ = ExtractionCache.objects.update_or_create(
+            checksum=checksum, config_version=version, defaults=values
+        )
+    else:
+        entry = ExtractionCache(checksum=checksum, config_version=version, **values)
+    entry.cache_hit = False
+    return entry
@@ -0,0 +1,21 @@
+from rest_framework import filters
+
+from .arabic import normalize_arabic
+
+
+class ArabicSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter for columns holding ``normalize_arabic`` output.
+
+    Search terms get the same normalization, so matches ignore tashkeel and
+    alef/hamza/ya/ta marbuta variants. Terms are matched with a plain
+    ``LIKE '%term%'`` (the column is already casefolded), which a
+    ``gin_trgm_ops`` index can serve, unlike the ``UPPER(...)`` of icontains.
+    """
+
+    def get_search_terms(self, request):
+        terms = (normalize_arabic(term) for term in super().get_search_terms(request))
+        return [term for term in terms if term]
+
+    def construct_search(self, field_name, *args):
+        return f"{field_name}__contains"
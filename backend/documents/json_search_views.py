@@ -5,77 +5,168 @@ instead of database models, for cases where migrations are not yet available.
 """
 
 import json
-import numpy as np
-from pathlib import Path
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from rest_framework import status
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
 
+from .corpus import get_corpus_manager
+from .corpus_stats import conditional_response
+from .model_registry import SEARCH_MODEL_NAME, is_loaded, model_stats
+from .query_cache import encode_queries, encode_query, get_query_cache
+from .readiness import CORPUS, not_ready_response, preload_components, readiness, start_loading
+
 logger = logging.getLogger(__name__)
 
-# Global variables for caching
-_model = None
-_chunks_data = None
-_search_index = None
+SEARCH_MODES = ('exact', 'ann', 'quantized')
+STREAM_FORMATS = ('ndjson', 'sse')
 
-def load_model():
-    """Load sentence transformer model."""
-    global _model
-    if _model is None:
-        try:
-            _model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
-            logger.info("Semantic search model loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading model: {e}")
-            raise
-    return _model
-
-def load_chunks_data():
-    """Load processed chunks data from JSON file."""
-    global _chunks_data
-    if _chunks_data is None:
-        try:
-            # Look for the JSON file in project root
-            json_file = Path(__file__).parent.parent.parent / "kitabs_embeddings.json"
-            if not json_file.exists():
-                logger.warning(f"Chunks data file not found: {json_file}")
-                return None
-            
-            with open(json_file, 'r', encoding='utf-8') as f:
-                _chunks_data = json.load(f)
-            
-            logger.info(f"Loaded {len(_chunks_data)} chunks from {json_file}")
-        except Exception as e:
-            logger.error(f"Error loading chunks data: {e}")
-            return None
+CORPUS_UNAVAILABLE = "Semantic search data not available. Books need to be processed first."
+
+def format_chunk_summary(chunk, similarity):
+    """Fields needed to render a result: identity, score and the Arabic text."""
+    return {
+        'id': chunk['id'],
+        'kitab_name': chunk['kitab_name'],
+        'author': chunk['author'],
+        'ibaroh': chunk['content_arabic'],  # Arabic text
+        'similarity_score': float(similarity),
+        'chunk_index': chunk['chunk_index'],
+    }
+
+def format_chunk_details(chunk):
+    """Heavier per-result fields: translation and chunk metadata."""
+    return {
+        'terjemahan': f"[Terjemahan otomatis akan ditambahkan] {chunk['content_arabic'][:100]}...",  # Placeholder translation
+        'metadata': chunk.get('metadata', {})
+    }
+
+def format_chunk_result(chunk, similarity):
+    """Shape a chunk and its similarity score for the search response."""
+    return {**format_chunk_summary(chunk, similarity), **format_chunk_details(chunk)}
+
+def rank_chunks(corpus, query_embedding, limit, threshold, mode, nprobe):
+    """
+    Rank a corpus generation against ``query_embedding`` with the given mode.
+
+    Returns ``(indices, scores, mode)``; the mode reported is the one actually
+    used, since quantized search falls back to exact below its recall floor,
+    and both quantized and ann search while their index is still being built.
+    """
+    # Quantized mode searches exactly if the codes are not ready or missed the recall floor
+    quantized_index = corpus.quantized_index() if mode == 'quantized' else None
+    if mode == 'quantized' and quantized_index is None:
+        mode = 'exact'
+    ivf_index = corpus.ann_index() if mode == 'ann' else None
+    if mode == 'ann' and ivf_index is None:
+        mode = 'exact'
     
-    return _chunks_data
+    if mode == 'ann':
+        # Score only the rows in the nprobe closest IVF cells
+        indices, scores = ivf_index.search(
+            corpus.chunk_index.matrix, query_embedding, limit=limit, threshold=threshold, nprobe=nprobe
+        )
+    elif mode == 'quantized':
+        # Candidates from the compact codes, re-scored against float rows
+        indices, scores = quantized_index.search(
+            query_embedding, limit=limit, threshold=threshold
+        )
+    else:
+        # Score every chunk in one matrix-vector product and keep the top-k
+        indices, scores = corpus.chunk_index.search(query_embedding, limit=limit, threshold=threshold)
+    return indices, scores, mode
 
-def load_search_index():
-    """Load search index from JSON file."""
-    global _search_index
-    if _search_index is None:
-        try:
-            # Look for the index file in project root
-            index_file = Path(__file__).parent.parent.parent / "kitabs_search_index.json"
-            if not index_file.exists():
-                logger.warning(f"Search index file not found: {index_file}")
-                return None
-            
-            with open(index_file, 'r', encoding='utf-8') as f:
-                _search_index = json.load(f)
-            
-            logger.info(f"Loaded search index with {_search_index.get('total_chunks', 0)} chunks")
-        except Exception as e:
-            logger.error(f"Error loading search index: {e}")
-            return None
+class StreamRenderer(BaseRenderer):
+    """
+    Lets clients negotiate a streaming format through the Accept header;
+    streamed bodies bypass rendering and errors are sent as
+    ``application/json``, not under the streaming content type.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = f"application/json; charset={self.charset}"
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+class NDJSONRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+class EventStreamRenderer(StreamRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+def stream_search_events(query, chunks, indices, scores, search_metadata):
+    """
+    Yield search response events once the top-k is known: ``meta``, one
+    ``result`` per hit (renderable on its own), then one ``details`` per hit
+    with the heavier fields, and finally ``done``.
+    """
+    yield 'meta', {'query': query, 'total_results': len(indices), 'search_metadata': search_metadata}
+    for rank, (i, score) in enumerate(zip(indices, scores)):
+        yield 'result', {'rank': rank, **format_chunk_summary(chunks[i], score)}
+    for rank, i in enumerate(indices):
+        yield 'details', {'rank': rank, 'id': chunks[i]['id'], **format_chunk_details(chunks[i])}
+    yield 'done', {'total_results': len(indices)}
+
+class LeasedStream:
+    """Streaming body that closes its corpus lease when the response is closed."""
+
+    def __init__(self, iterator, lease):
+        self._iterator = iterator
+        self._lease = lease
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        self._iterator.close()
+        if self._lease is not None:
+            self._lease.close()
+
+class AsyncLeasedStream(LeasedStream):
+    """
+    ``LeasedStream`` for the ASGI handler, which buffers a synchronous body
+    completely before sending it. The events are built from the in-memory
+    corpus, so iterating them on the event loop does not block it.
+    """
+    __iter__ = None  # so StreamingHttpResponse takes the async path
+
+    async def __aiter__(self):
+        for part in self._iterator:
+            yield part
+
+def streaming_search_response(events, stream_format, lease=None, asynchronous=False):
+    """
+    Encode search events as NDJSON lines or Server-Sent Events. The corpus
+    ``lease`` is held until the response is closed, i.e. until the stream
+    ends or the client goes away. Under ASGI (``asynchronous``) the body is
+    an async iterator; a synchronous one would be buffered whole by Django.
+    """
+    def encode():
+        for event, payload in events:
+            data = json.dumps(payload, ensure_ascii=False)
+            if stream_format == 'sse':
+                yield f"event: {event}\ndata: {data}\n\n"
+            else:
+                yield json.dumps({'event': event, **payload}, ensure_ascii=False) + "\n"
     
-    return _search_index
+    content_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    body = (AsyncLeasedStream if asynchronous else LeasedStream)(encode(), lease)
+    response = StreamingHttpResponse(body, content_type=f"{content_type}; charset=utf-8")
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+    return response
 
 @api_view(['POST'])
+@renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer, EventStreamRenderer])
 def json_semantic_search(request):
     """
     Perform semantic search using pre-processed JSON data.
@@ -84,77 +175,99 @@ def json_semantic_search(request):
     {
         "q": "search query in Indonesian or English",
         "limit": 10,
-        "threshold": 0.7
+        "threshold": 0.7,
+        "mode": "exact" | "ann" | "quantized",
+        "nprobe": 8,
+        "stream": "ndjson" | "sse"
     }
+    
+    ``mode=ann`` searches the IVF approximate index; ``nprobe`` (cells
+    probed) trades latency for recall. ``mode=quantized`` ranks int8 or
+    binary codes and re-scores the best candidates exactly.
+    
+    With ``stream`` set (or an ``Accept: application/x-ndjson`` or
+    ``text/event-stream`` header), the response is streamed as NDJSON or
+    Server-Sent Events: results are emitted as soon as the top-k is known and their
+    translation/metadata follow afterwards (see ``stream_search_events``).
     """
     try:
         # Get parameters
         query = request.data.get('q', '').strip()
         limit = int(request.data.get('limit', 10))
         threshold = float(request.data.get('threshold', 0.7))
+        mode = request.data.get('mode', 'exact')
+        nprobe = int(request.data.get('nprobe', settings.ANN_DEFAULT_NPROBE))
+        stream_format = request.data.get('stream')
+        if not stream_format and request.accepted_renderer.format in STREAM_FORMATS:
+            stream_format = request.accepted_renderer.format
         
         if not query:
             return Response(
                 {"error": "Query parameter 'q' is required"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Load model and data
-        model = load_model()
-        chunks_data = load_chunks_data()
-        
-        if not chunks_data:
+        if mode not in SEARCH_MODES:
             return Response(
-                {"error": "Semantic search data not available. Books need to be processed first."}, 
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+                {"error": f"Parameter 'mode' must be one of: {', '.join(SEARCH_MODES)}"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return Response(
+                {"error": f"Parameter 'stream' must be one of: {', '.join(STREAM_FORMATS)}"}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Generate query embedding
-        query_embedding = model.encode(query)
-        
-        # Calculate similarities
-        results = []
-        for chunk in chunks_data:
-            try:
-                # Convert stored embedding back to numpy array
-                chunk_embedding = np.array(chunk['embedding'])
-                
-                # Calculate cosine similarity
-                similarity = cosine_similarity(
-                    query_embedding.reshape(1, -1), 
-                    chunk_embedding.reshape(1, -1)
-                )[0][0]
-                
-                if similarity >= threshold:
-                    results.append({
-                        'id': chunk['id'],
-                        'kitab_name': chunk['kitab_name'],
-                        'author': chunk['author'],
-                        'ibaroh': chunk['content_arabic'],  # Arabic text
-                        'terjemahan': f"[Terjemahan otomatis akan ditambahkan] {chunk['content_arabic'][:100]}...",  # Placeholder translation
-                        'similarity_score': float(similarity),
-                        'chunk_index': chunk['chunk_index'],
-                        'metadata': chunk.get('metadata', {})
-                    })
-            except Exception as e:
-                logger.warning(f"Error processing chunk {chunk.get('id', 'unknown')}: {e}")
-                continue
-        
-        # Sort by similarity and limit results
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        results = results[:limit]
+        unavailable = not_ready_response()
+        if unavailable is not None:
+            return unavailable
+        
+        # Lease the current corpus generation so a reload cannot release it mid-search
+        lease = get_corpus_manager().acquire()
+        streaming = False
+        try:
+            corpus = lease.generation
+            if corpus is None:
+                return Response(
+                    {"error": CORPUS_UNAVAILABLE}, 
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+            
+            # Generate query embedding (cached for repeated questions)
+            query_embedding = encode_query(query, SEARCH_MODEL_NAME)
+            
+            indices, scores, mode = rank_chunks(corpus, query_embedding, limit, threshold, mode, nprobe)
+            search_metadata = {
+                'threshold': threshold,
+                'limit': limit,
+                'mode': mode,
+                'nprobe': nprobe if mode == 'ann' else None,
+                'total_chunks_searched': len(corpus),
+                'corpus_generation': corpus.number,
+                'model_used': SEARCH_MODEL_NAME
+            }
+            
+            if stream_format:
+                events = stream_search_events(query, corpus.chunks, indices, scores, search_metadata)
+                response = streaming_search_response(
+                    events, stream_format, lease, asynchronous=isinstance(request._request, ASGIRequest)
+                )
+                streaming = True
+                return response
+            
+            results = [
+                format_chunk_result(corpus.chunks[i], score)
+                for i, score in zip(indices, scores)
+            ]
+        finally:
+            if not streaming:
+                lease.close()
         
         # Prepare response
         response_data = {
             'query': query,
             'total_results': len(results),
             'results': results,
-            'search_metadata': {
-                'threshold': threshold,
-                'limit': limit,
-                'total_chunks_searched': len(chunks_data),
-                'model_used': 'paraphrase-multilingual-mpnet-base-v2'
-            }
+            'search_metadata': search_metadata
         }
         
         return Response(response_data, status=status.HTTP_200_OK)
@@ -166,54 +279,129 @@ def json_semantic_search(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(['GET'])
-def search_stats(request):
-    """Get statistics about the available search data."""
+@api_view(['POST'])
+def json_batch_semantic_search(request):
+    """
+    Run several semantic searches in one request.
+    
+    Expected payload:
+    {
+        "queries": [
+            "plain query string",
+            {"q": "query", "limit": 5, "threshold": 0.6}
+        ],
+        "limit": 10,
+        "threshold": 0.7
+    }
+    
+    Top-level ``limit``/``threshold`` are defaults for queries that do not set
+    their own. Cache misses are encoded in one batched model call and all
+    queries are scored against the chunk matrix in one matrix-matrix product
+    (exact search). Results are grouped per query, in request order.
+    """
     try:
-        chunks_data = load_chunks_data()
-        search_index = load_search_index()
+        items = request.data.get('queries')
+        default_limit = int(request.data.get('limit', 10))
+        default_threshold = float(request.data.get('threshold', 0.7))
         
-        if not chunks_data:
+        if not isinstance(items, list) or not items:
             return Response(
-                {"error": "No search data available"}, 
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+                {"error": "Parameter 'queries' must be a non-empty list"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.SEARCH_BATCH_MAX_QUERIES:
+            return Response(
+                {"error": f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries are allowed per batch"}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Basic statistics
-        stats = {
-            'total_chunks': len(chunks_data),
-            'total_books': len(search_index.get('books', {})) if search_index else 0,
-            'total_authors': len(search_index.get('authors', {})) if search_index else 0,
-            'data_available': True
-        }
+        queries, limits, thresholds = [], [], []
+        for item in items:
+            if isinstance(item, str):
+                item = {'q': item}
+            query = item.get('q') if isinstance(item, dict) else None
+            query = query.strip() if isinstance(query, str) else ''
+            if not query:
+                return Response(
+                    {"error": "Every query needs a non-empty string 'q'"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queries.append(query)
+            limits.append(int(item.get('limit', default_limit)))
+            thresholds.append(float(item.get('threshold', default_threshold)))
         
-        # Book statistics
-        if search_index:
-            books_info = []
-            for book_name, book_data in search_index.get('books', {}).items():
-                books_info.append({
-                    'name': book_name,
-                    'author': book_data.get('author', 'Unknown'),
-                    'chunk_count': book_data.get('chunk_count', 0)
-                })
+        unavailable = not_ready_response()
+        if unavailable is not None:
+            return unavailable
+        
+        with get_corpus_manager().acquire() as corpus:
+            if corpus is None:
+                return Response(
+                    {"error": CORPUS_UNAVAILABLE}, 
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
             
-            # Sort by chunk count
-            books_info.sort(key=lambda x: x['chunk_count'], reverse=True)
-            stats['books'] = books_info[:20]  # Top 20 books
+            query_embeddings = encode_queries(queries, SEARCH_MODEL_NAME)
+            ranked = corpus.chunk_index.search_many(query_embeddings, limits, thresholds)
             
-            # Author statistics
-            authors_info = []
-            for author_name, author_data in search_index.get('authors', {}).items():
-                authors_info.append({
-                    'name': author_name,
-                    'book_count': len(author_data.get('books', [])),
-                    'chunk_count': author_data.get('chunk_count', 0)
+            grouped = []
+            for query, limit, threshold, (indices, scores) in zip(queries, limits, thresholds, ranked):
+                results = [
+                    format_chunk_result(corpus.chunks[i], score)
+                    for i, score in zip(indices, scores)
+                ]
+                grouped.append({
+                    'query': query,
+                    'limit': limit,
+                    'threshold': threshold,
+                    'total_results': len(results),
+                    'results': results
                 })
-            
-            authors_info.sort(key=lambda x: x['chunk_count'], reverse=True)
-            stats['authors'] = authors_info
+            search_metadata = {
+                'mode': 'exact',
+                'total_chunks_searched': len(corpus),
+                'corpus_generation': corpus.number,
+                'model_used': SEARCH_MODEL_NAME
+            }
+        
+        return Response({
+            'total_queries': len(grouped),
+            'searches': grouped,
+            'search_metadata': search_metadata
+        }, status=status.HTTP_200_OK)
+        
+    except (TypeError, ValueError) as e:
+        return Response(
+            {"error": f"Invalid batch parameters: {str(e)}"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        logger.error(f"Error in batch semantic search: {e}")
+        return Response(
+            {"error": f"Internal server error: {str(e)}"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+def search_stats(request):
+    """
+    Get statistics about the available search data.
+    
+    The payload is precomputed once per corpus generation and carries an
+    ETag, so ``If-None-Match`` revalidation returns ``304 Not Modified``.
+    """
+    try:
+        unavailable = not_ready_response((CORPUS,))
+        if unavailable is not None:
+            return unavailable
         
-        return Response(stats, status=status.HTTP_200_OK)
+        with get_corpus_manager().acquire() as corpus:
+            if corpus is None:
+                return Response(
+                    {"error": "No search data available"}, 
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+            return conditional_response(request, corpus.statistics_etag, corpus.statistics)
         
     except Exception as e:
         logger.error(f"Error getting search stats: {e}")
@@ -224,16 +412,28 @@ def search_stats(request):
 
 @api_view(['GET'])
 def health_check(request):
-    """Check if semantic search is ready."""
+    """
+    Report whether semantic search is ready.
+    
+    Never waits for the model or corpus: loading is started in the
+    background (if it is not already running) and its progress reported.
+    """
     try:
-        model = load_model()
-        chunks_data = load_chunks_data()
-        
+        components = preload_components()
+        start_loading(components)
+        state = readiness(components)
+        manager = get_corpus_manager()
+        corpus = manager.current
         health_status = {
-            'model_loaded': model is not None,
-            'data_loaded': chunks_data is not None,
-            'total_chunks': len(chunks_data) if chunks_data else 0,
-            'ready': model is not None and chunks_data is not None
+            'model_loaded': is_loaded(SEARCH_MODEL_NAME),
+            'data_loaded': corpus is not None,
+            'total_chunks': len(corpus) if corpus is not None else 0,
+            'ready': state['ready'],
+            'readiness': state,
+            'corpus': manager.stats(),
+            'models': model_stats(),
+            'query_cache': get_query_cache().stats(),
+            'quantized_index': corpus.quantized_stats() if corpus is not None else None
         }
         
         status_code = status.HTTP_200_OK if health_status['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE
@@ -249,4 +449,20 @@ def health_check(request):
                 'error': str(e)
             }, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        ) 
\ No newline at end of file
+        )
+
+@api_view(['GET'])
+def readiness_check(request):
+    """
+    Readiness probe: 200 once the ``SEMANTIC_SEARCH_PRELOAD`` components
+    are loaded (or, for the corpus, not configured), 503 (with
+    ``Retry-After`` while loading) before that. The body has each
+    component's state, bytes loaded and elapsed time.
+    """
+    components = preload_components()
+    start_loading(components)
+    state = readiness(components)
+    if state['ready']:
+        return Response(state, status=status.HTTP_200_OK)
+    headers = {'Retry-After': str(settings.SEMANTIC_SEARCH_RETRY_AFTER)} if state['loading'] else None
+    return Response(state, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
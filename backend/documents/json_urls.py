@@ -3,10 +3,15 @@ URL patterns for JSON-based semantic search
 """
 
 from django.urls import path
-from .json_search_views import json_semantic_search, search_stats, health_check
+from .json_search_views import (
+    json_semantic_search, json_batch_semantic_search, search_stats, health_check,
+    readiness_check
+)
 
 urlpatterns = [
     path('json-search/', json_semantic_search, name='json_semantic_search'),
+    path('json-search/batch/', json_batch_semantic_search, name='json_batch_semantic_search'),
     path('search-stats/', search_stats, name='search_stats'),
     path('search-health/', health_check, name='search_health_check'),
+    path('search-ready/', readiness_check, name='search_readiness_check'),
 ] 
\ No newline at end of file
@@ -0,0 +1,376 @@
+import itertools
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from documents import ann_index, quantization
+from documents.arabic import chunk_search_text
+from documents.benchmark import (
+    StubEncoder, SyntheticChunks, latency_summary, per_chunk_search, recall_at_k,
+    sample_query_rows, synthetic_embeddings, time_queries,
+)
+from documents.embedding_index import ChunkEmbeddingIndex
+from documents.model_registry import DOCUMENT_MODEL_NAME, SEARCH_MODEL_NAME, register_model
+from documents.models import Document, TextChunk
+
+User = get_user_model()
+
+JSON_PATHS = ['json-brute-force', 'vectorized', 'ann', 'quantized']
+DATABASE_PATHS = ['pgvector', 'pgvector-ann', 'hybrid']
+# Dimensions of the TextChunk / Document vector columns
+DATABASE_DIM = 768
+INSERT_BATCH = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every search path against a synthetic corpus and a deterministic '
+        'stub encoder; writes p50/p95/p99 latency, QPS and recall as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunks',
+            type=int,
+            default=100000,
+            help='Number of synthetic chunks (default: 100000). The float32 matrix '
+                 'takes chunks * dim * 4 bytes'
+        )
+        parser.add_argument(
+            '--dim',
+            type=int,
+            default=768,
+            help='Embedding dimensions (default: 768; database paths require 768)'
+        )
+        parser.add_argument(
+            '--clusters',
+            type=int,
+            default=256,
+            help='Centres the synthetic vectors are scattered around; 0 for uniform '
+                 'random vectors (default: 256)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of timed queries per path (default: 200)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Untimed queries run first on each path (default: 5)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Top-k results per query (default: 10)'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.0,
+            help='Similarity threshold (default: 0.0)'
+        )
+        parser.add_argument(
+            '--paths',
+            type=str,
+            default=','.join(JSON_PATHS),
+            help=f"Comma-separated search paths (default: {','.join(JSON_PATHS)}); "
+                 f"also available: {','.join(DATABASE_PATHS)} (PostgreSQL + pgvector, "
+                 f"needs a database without text chunks, seeds and afterwards deletes synthetic rows)"
+        )
+        parser.add_argument(
+            '--nprobe',
+            type=int,
+            default=settings.ANN_DEFAULT_NPROBE,
+            help='IVF cells probed by the ann path'
+        )
+        parser.add_argument(
+            '--ef',
+            type=int,
+            default=settings.ANN_DEFAULT_EF_SEARCH,
+            help='hnsw.ef_search for the pgvector-ann path'
+        )
+        parser.add_argument(
+            '--brute-force-max',
+            type=int,
+            default=100000,
+            help='Skip json-brute-force above this many chunks (default: 100000)'
+        )
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=10000,
+            help='Synthetic documents seeded for the hybrid path (default: 10000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the synthetic corpus (default: 0)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the JSON report to this file instead of stdout'
+        )
+
+    def handle(self, *args, **options):
+        paths = [path.strip() for path in options['paths'].split(',') if path.strip()]
+        unknown = set(paths) - set(JSON_PATHS + DATABASE_PATHS)
+        if unknown:
+            raise CommandError(f"Unknown paths: {', '.join(sorted(unknown))}")
+        if options['chunks'] <= 0 or options['queries'] <= 0:
+            raise CommandError("--chunks and --queries must be positive")
+        if set(paths) & set(DATABASE_PATHS) and options['dim'] != DATABASE_DIM:
+            raise CommandError(f"Database paths need --dim {DATABASE_DIM}")
+        if set(paths) & set(DATABASE_PATHS) and TextChunk.objects.exists():
+            # The pgvector paths rank every TextChunk row; other rows would
+            # count against recall and latency of the synthetic corpus
+            raise CommandError(
+                "Database paths need a database without text chunks (left over from an "
+                "interrupted run: delete the documents with metadata.benchmark = true)"
+            )
+
+        self.options = options
+        n, dim, seed = options['chunks'], options['dim'], options['seed']
+
+        self.log(f"Generating {n} synthetic chunks with {dim} dims")
+        start = time.perf_counter()
+        self.matrix = synthetic_embeddings(n, dim, seed, clusters=options['clusters'])
+        self.chunks = SyntheticChunks(n, seed)
+        self.query_rows = sample_query_rows(n, options['queries'], seed).tolist()
+        self.queries = [self.chunks[row]['content_arabic'] for row in self.query_rows]
+        self.encoder = StubEncoder(dim, anchors=dict(zip(self.queries, self.matrix[self.query_rows])))
+        register_model(SEARCH_MODEL_NAME, self.encoder)
+        register_model(DOCUMENT_MODEL_NAME, self.encoder)
+        build_seconds = {'corpus': round(time.perf_counter() - start, 3)}
+
+        # Exact top-k per query, the reference for recall of approximate paths
+        self.index = ChunkEmbeddingIndex(self.matrix, self.chunks, normalized=True)
+        self.exact = [
+            self.index.search(self.encoder.encode(query), self.options['limit'], self.options['threshold'])[0].tolist()
+            for query in self.queries
+        ]
+
+        results = {}
+        try:
+            for path in paths:
+                self.log(f"Benchmarking {path}")
+                try:
+                    results[path] = getattr(self, 'bench_' + path.replace('-', '_'))(build_seconds)
+                except Exception as e:
+                    results[path] = {'error': str(e)}
+                    self.log(self.style.ERROR(f"{path} failed: {e}"))
+                    continue
+                if 'p50_ms' in results[path]:
+                    self.log(
+                        f"  p50 {results[path]['p50_ms']} ms, p95 {results[path]['p95_ms']} ms, "
+                        f"p99 {results[path]['p99_ms']} ms, {results[path]['qps']} QPS"
+                    )
+        finally:
+            self.cleanup()
+
+        report = {
+            'benchmark': 'search',
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'config': {
+                key: options[key] for key in (
+                    'chunks', 'dim', 'clusters', 'queries', 'warmup', 'limit', 'threshold',
+                    'nprobe', 'ef', 'documents', 'seed'
+                )
+            },
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'database': connection.vendor,
+            },
+            'build_seconds': build_seconds,
+            'results': results,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.log(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def log(self, message):
+        # Progress goes to stderr so stdout stays a clean JSON document
+        self.stderr.write(message)
+
+    def run(self, search, expected_ids):
+        """
+        Time ``search(query_text)`` over the queries. ``recall_at_k`` is the
+        overlap of each result list with ``expected_ids`` for that query.
+        """
+        latencies, found = time_queries(search, self.queries, warmup=self.options['warmup'])
+        summary = latency_summary(latencies)
+        summary['recall_at_k'] = recall_at_k(found, expected_ids)
+        return summary
+
+    def bench_json_brute_force(self, build_seconds):
+        n = len(self.chunks)
+        if n > self.options['brute_force_max']:
+            return {'skipped': f"{n} chunks is above --brute-force-max {self.options['brute_force_max']}"}
+        chunks_data = [{'id': i, 'embedding': row.tolist()} for i, row in enumerate(self.matrix)]
+        limit, threshold = self.options['limit'], self.options['threshold']
+        return self.run(lambda q: [
+            i for i, _ in per_chunk_search(chunks_data, self.encoder.encode(q), limit, threshold)
+        ], self.exact)
+
+    def bench_vectorized(self, build_seconds):
+        limit, threshold = self.options['limit'], self.options['threshold']
+        return self.run(
+            lambda q: self.index.search(self.encoder.encode(q), limit, threshold)[0].tolist(), self.exact
+        )
+
+    def bench_ann(self, build_seconds):
+        start = time.perf_counter()
+        index = ann_index.IVFIndex.build(self.matrix, seed=self.options['seed'])
+        build_seconds['ann'] = round(time.perf_counter() - start, 3)
+        limit, threshold, nprobe = self.options['limit'], self.options['threshold'], self.options['nprobe']
+        result = self.run(lambda q: index.search(
+            self.matrix, self.encoder.encode(q), limit, threshold, nprobe=nprobe
+        )[0].tolist(), self.exact)
+        result.update({'nprobe': nprobe, 'n_lists': index.n_lists})
+        return result
+
+    def bench_quantized(self, build_seconds):
+        start = time.perf_counter()
+        index = quantization.QuantizedEmbeddingIndex.build(
+            self.matrix, kind=settings.QUANTIZATION_KIND, rescore_factor=settings.QUANTIZED_RESCORE_FACTOR
+        )
+        build_seconds['quantized'] = round(time.perf_counter() - start, 3)
+        limit, threshold = self.options['limit'], self.options['threshold']
+        result = self.run(lambda q: index.search(self.encoder.encode(q), limit, threshold)[0].tolist(), self.exact)
+        result.update({'kind': index.kind, 'rescore_factor': index.rescore_factor})
+        return result
+
+    # Database paths
+
+    def database(self, build_seconds):
+        """Seed the synthetic corpus into TextChunk / Document once per run."""
+        if getattr(self, 'seeded', None) is not None:
+            return self.seeded
+        if connection.vendor != 'postgresql':
+            raise CommandError("Database paths need PostgreSQL with pgvector")
+
+        start = time.perf_counter()
+        user, created = User.objects.get_or_create(
+            username='benchmark', defaults={'email': 'benchmark@bahtsulmasail.tech'}
+        )
+        self.created_user = getattr(self, 'created_user', False) or created
+        corpus_document = self.synthetic_document(user, 'Synthetic benchmark corpus', '')
+        corpus_document.save()
+        chunk_ids = []
+        for first in range(0, len(self.chunks), INSERT_BATCH):
+            rows = []
+            for i in range(first, min(first + INSERT_BATCH, len(self.chunks))):
+                chunk = self.chunks[i]
+                rows.append(TextChunk(
+                    source_document=corpus_document,
+                    kitab_name=chunk['kitab_name'],
+                    author=chunk['author'],
+                    content_arabic=chunk['content_arabic'],
+                    # bulk_create bypasses TextChunk.save()
+                    search_text=chunk_search_text(chunk['kitab_name'], chunk['author'], chunk['content_arabic']),
+                    embedding=self.matrix[i].tolist(),
+                    chunk_index=i,
+                    metadata=chunk['metadata'],
+                ))
+            TextChunk.objects.bulk_create(rows)
+            chunk_ids.extend(row.pk for row in rows)
+        build_seconds['database_seed'] = round(time.perf_counter() - start, 3)
+        self.seeded = chunk_ids
+        return chunk_ids
+
+    def synthetic_document(self, user, title, text, embedding=None):
+        return Document(
+            title=title,
+            file_path='benchmark://synthetic',
+            file_size=len(text.encode('utf-8')),
+            mime_type='text/plain',
+            checksum='',
+            created_by=user,
+            ocr_status='completed',
+            extracted_text=text,
+            embedding=embedding,
+            language='ar',
+            metadata={'benchmark': True},
+        )
+
+    def bench_pgvector(self, build_seconds, mode='exact'):
+        from documents.views import DocumentViewSet
+
+        chunk_ids = self.database(build_seconds)
+        exact_ids = [[chunk_ids[i] for i in row] for row in self.exact]
+        viewset = DocumentViewSet()
+        limit, threshold, ef = self.options['limit'], self.options['threshold'], self.options['ef']
+        result = self.run(
+            lambda q: [chunk.pk for chunk in viewset._rank_text_chunks(
+                self.encoder.encode(q), limit, threshold, mode, ef
+            )],
+            exact_ids,
+        )
+        result['mode'] = mode
+        if mode == 'ann':
+            result['ef_search'] = ef
+        return result
+
+    def bench_pgvector_ann(self, build_seconds):
+        return self.bench_pgvector(build_seconds, mode='ann')
+
+    def bench_hybrid(self, build_seconds):
+        from documents.views import DocumentViewSet
+
+        self.database(build_seconds)
+        start = time.perf_counter()
+        user = User.objects.get(username='benchmark')
+        # One document per query chunk (the document each query should find),
+        # padded with further chunks up to --documents
+        taken = set(self.query_rows)
+        padding = (i for i in range(len(self.chunks)) if i not in taken)
+        n_padding = max(0, min(self.options['documents'], len(self.chunks)) - len(self.query_rows))
+        document_rows = self.query_rows + list(itertools.islice(padding, n_padding))
+        documents = []
+        for first in range(0, len(document_rows), INSERT_BATCH):
+            documents += Document.objects.bulk_create([
+                self.synthetic_document(
+                    user, self.chunks[i]['kitab_name'], self.chunks[i]['content_arabic'], self.matrix[i].tolist()
+                )
+                for i in document_rows[first:first + INSERT_BATCH]
+            ])
+        build_seconds['hybrid_seed'] = round(time.perf_counter() - start, 3)
+
+        viewset = DocumentViewSet()
+        queryset = Document.objects.filter(metadata__benchmark=True, ocr_status='completed').exclude(extracted_text='')
+        weights = {'keyword': settings.HYBRID_KEYWORD_WEIGHT, 'semantic': settings.HYBRID_SEMANTIC_WEIGHT}
+        limit = self.options['limit']
+        result = self.run(
+            lambda q: [document.pk for document in viewset._perform_hybrid_search(queryset, q, weights)[:limit]],
+            [[document.pk] for document in documents[:len(self.query_rows)]],
+        )
+        result['documents'] = len(documents)
+        return result
+
+    def cleanup(self):
+        # Also after a failed seed, which may have inserted some rows
+        if getattr(self, 'created_user', None) is not None:
+            deleted, _ = Document.objects.filter(metadata__benchmark=True).delete()
+            self.log(f"Deleted {deleted} synthetic rows")
+            if self.created_user:
+                User.objects.filter(username='benchmark').delete()
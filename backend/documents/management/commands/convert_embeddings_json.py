@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.embedding_store import DEFAULT_STORE_NAME, convert_json_to_store
+
+
+class Command(BaseCommand):
+    help = 'Convert kitabs_embeddings.json into the binary, memory-mapped embedding store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--input',
+            type=str,
+            default=None,
+            help='Path to the legacy JSON file (default: <SEMANTIC_SEARCH_DATA_DIR>/kitabs_embeddings.json)'
+        )
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=None,
+            help='Directory to write the store to (default: SEMANTIC_SEARCH_DATA_DIR)'
+        )
+        parser.add_argument(
+            '--name',
+            type=str,
+            default=DEFAULT_STORE_NAME,
+            help=f'Store name prefix (default: {DEFAULT_STORE_NAME})'
+        )
+        parser.add_argument(
+            '--model',
+            type=str,
+            default='paraphrase-multilingual-mpnet-base-v2',
+            help='Model the embeddings were generated with, recorded in the manifest'
+        )
+
+    def handle(self, *args, **options):
+        data_dir = Path(settings.SEMANTIC_SEARCH_DATA_DIR)
+        json_file = Path(options['input']) if options['input'] else data_dir / 'kitabs_embeddings.json'
+        output_dir = Path(options['output_dir']) if options['output_dir'] else data_dir
+
+        if not json_file.exists():
+            raise CommandError(f"File {json_file} does not exist")
+
+        self.stdout.write(f"Converting {json_file} into {output_dir}")
+        try:
+            manifest = convert_json_to_store(
+                json_file, output_dir, name=options['name'], model_name=options['model']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {manifest['count']} chunks x {manifest['dimensions']} dims "
+                f"to {output_dir / manifest['embeddings_file']}"
+            )
+        )
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import pgvector.django
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+        ('vectors', '0001_initial'),  # pgvector extension
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextChunk',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kitab_name', models.CharField(help_text='Name of the Islamic book', max_length=255)),
+                ('author', models.CharField(help_text='Author of the book', max_length=255)),
+                ('content_arabic', models.TextField(help_text='Raw Arabic text chunk')),
+                ('embedding', pgvector.django.VectorField(blank=True, dimensions=768, help_text='Vector embedding of the text chunk', null=True)),
+                ('metadata', models.JSONField(default=dict, help_text='Extra info like page number or chapter')),
+                ('chunk_index', models.IntegerField(help_text='Index of this chunk within the document')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('source_document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_chunks', to='documents.document')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['source_document'], name='documents_t_source__2c9d52_idx'),
+                    models.Index(fields=['kitab_name'], name='documents_t_kitab_n_a57cdf_idx'),
+                    models.Index(fields=['author'], name='documents_t_author_04d9a4_idx'),
+                    models.Index(fields=['chunk_index'], name='documents_t_chunk_i_a34972_idx'),
+                ],
+                'unique_together': {('source_document', 'chunk_index')},
+            },
+        ),
+        # Approximate nearest neighbour index so semantic search can
+        # ORDER BY embedding <=> query LIMIT k without scanning every chunk.
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX IF NOT EXISTS textchunk_embedding_hnsw_idx ON documents_textchunk
+            USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+            """,
+            reverse_sql="DROP INDEX IF EXISTS textchunk_embedding_hnsw_idx;"
+        ),
+    ]
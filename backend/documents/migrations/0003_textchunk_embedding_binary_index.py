@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_textchunk_embedding_hnsw_index'),
+    ]
+
+    operations = [
+        # HNSW index over the sign bits of each embedding (96 bytes instead of
+        # 3 KB per row) for semantic search mode=quantized, which re-ranks its
+        # candidates by exact cosine distance. binary_quantize() needs
+        # pgvector >= 0.7.0, so older installs skip the index.
+        migrations.RunSQL(
+            sql="""
+            DO $$
+            BEGIN
+                IF (SELECT string_to_array(extversion, '.')::int[] >= ARRAY[0, 7, 0]
+                    FROM pg_extension WHERE extname = 'vector') THEN
+                    CREATE INDEX IF NOT EXISTS textchunk_embedding_bq_idx ON documents_textchunk
+                    USING hnsw ((binary_quantize(embedding)::bit(768)) bit_hamming_ops);
+                END IF;
+            END $$;
+            """,
+            reverse_sql="DROP INDEX IF EXISTS textchunk_embedding_bq_idx;"
+        ),
+    ]
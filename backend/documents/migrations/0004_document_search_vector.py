@@ -0,0 +1,50 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_textchunk_embedding_binary_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted tsvector of title (A) and extracted_text (B), maintained by a database trigger', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='document_search_vector_gin'),
+        ),
+        # Keep search_vector in step with title and extracted_text on every
+        # write path (ORM saves, bulk updates and raw SQL), using the same
+        # weights keyword search used to compute per query, then backfill.
+        migrations.RunSQL(
+            sql="""
+            CREATE OR REPLACE FUNCTION documents_document_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector(COALESCE(NEW.title, '')), 'A') ||
+                    setweight(to_tsvector(COALESCE(NEW.extracted_text, '')), 'B');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS documents_document_search_vector_trigger ON documents_document;
+            CREATE TRIGGER documents_document_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF title, extracted_text ON documents_document
+            FOR EACH ROW EXECUTE FUNCTION documents_document_search_vector_update();
+
+            UPDATE documents_document SET search_vector =
+                setweight(to_tsvector(COALESCE(title, '')), 'A') ||
+                setweight(to_tsvector(COALESCE(extracted_text, '')), 'B');
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS documents_document_search_vector_trigger ON documents_document;
+            DROP FUNCTION IF EXISTS documents_document_search_vector_update();
+            """
+        ),
+    ]
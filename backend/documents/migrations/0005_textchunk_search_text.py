@@ -0,0 +1,40 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from documents.arabic import chunk_search_text
+
+
+def backfill_search_text(apps, schema_editor):
+    TextChunk = apps.get_model('documents', 'TextChunk')
+    batch = []
+    chunks = TextChunk.objects.only('kitab_name', 'author', 'content_arabic').iterator(chunk_size=2000)
+    for chunk in chunks:
+        chunk.search_text = chunk_search_text(chunk.kitab_name, chunk.author, chunk.content_arabic)
+        batch.append(chunk)
+        if len(batch) >= 2000:
+            TextChunk.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        TextChunk.objects.bulk_update(batch, ['search_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_document_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='textchunk',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Normalized kitab name, author and Arabic content for keyword search'),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='textchunk',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_text'], name='textchunk_search_text_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_kitab_statistics(apps, schema_editor):
+    TextChunk = apps.get_model('documents', 'TextChunk')
+    KitabStatistics = apps.get_model('documents', 'KitabStatistics')
+    counts = TextChunk.objects.values('kitab_name', 'author').annotate(chunk_count=Count('id')).order_by()
+    KitabStatistics.objects.bulk_create(
+        [KitabStatistics(**row) for row in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_textchunk_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitabStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kitab_name', models.CharField(max_length=255)),
+                ('author', models.CharField(max_length=255)),
+                ('chunk_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'kitab statistics',
+                'unique_together': {('kitab_name', 'author')},
+            },
+        ),
+        migrations.RunPython(backfill_kitab_statistics, migrations.RunPython.noop),
+    ]
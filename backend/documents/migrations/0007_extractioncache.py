@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_kitabstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(help_text='SHA-256 of the file content', max_length=64)),
+                ('config_version', models.CharField(help_text='Hash of the extractor and OCR configuration', max_length=40)),
+                ('config', models.JSONField(default=dict, help_text='Extractor and OCR configuration behind config_version')),
+                ('pages', models.JSONField(default=list, help_text='Per-page text, source and quality')),
+                ('summary', models.JSONField(default=dict, help_text='Extraction summary (pages per source, OCR timing)')),
+                ('metadata', models.JSONField(default=dict, help_text='Document information of the file, e.g. PDF metadata')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='documents_e_last_us_914c15_idx')],
+                'unique_together': {('checksum', 'config_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,112 @@
+"""
+Process-wide registry of sentence-transformer models.
+
+Constructing a ``SentenceTransformer`` is a multi-second, hundreds-of-MB
+operation, so each named model is loaded at most once per process and shared
+by every view, task and management command. ``warm_up`` is called at web and
+worker start so the first request does not pay the load.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Model used for the kitab chunk corpus (768 dims, matches TextChunk.embedding)
+SEARCH_MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+# Model used for whole-document embeddings
+DOCUMENT_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _rss_bytes():
+    """Resident set size of this process, or None where it can't be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _load_model(name):
+    from sentence_transformers import SentenceTransformer
+
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    model = SentenceTransformer(name)
+    load_seconds = time.perf_counter() - start
+
+    # A dummy encode initialises lazy kernels and allocator pools
+    start = time.perf_counter()
+    model.encode(['warm-up'])
+    warmup_seconds = time.perf_counter() - start
+
+    rss_after = _rss_bytes()
+    memory_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    _stats[name] = {
+        'load_seconds': round(load_seconds, 3),
+        'warmup_seconds': round(warmup_seconds, 3),
+        'memory_bytes': memory_bytes,
+        'loaded_at': time.time(),
+        'pid': os.getpid(),
+    }
+    memory_mb = f"{memory_bytes / 2**20:.0f} MB" if memory_bytes is not None else "unknown memory"
+    logger.info(
+        f"Loaded embedding model {name} in {load_seconds:.2f}s "
+        f"(warm-up {warmup_seconds:.2f}s, {memory_mb})"
+    )
+    return model
+
+
+def get_model(name=SEARCH_MODEL_NAME):
+    """Return the process-wide instance of model ``name``, loading it on first use."""
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = _load_model(name)
+                _models[name] = model
+    return model
+
+
+def register_model(name, model):
+    """
+    Install ``model`` (anything with a SentenceTransformer-style ``encode``)
+    as the process-wide instance of ``name``, e.g. the deterministic stub
+    encoder of the benchmark suite.
+    """
+    with _lock:
+        _models[name] = model
+
+
+def is_loaded(name=SEARCH_MODEL_NAME):
+    return name in _models
+
+
+def warm_up(names=None):
+    """
+    Load and warm the given models (default: ``EMBEDDING_WARMUP_MODELS``).
+
+    Failures are logged rather than raised so a missing model does not stop
+    the process from starting; the next ``get_model`` call will retry.
+    """
+    if names is None:
+        names = getattr(settings, 'EMBEDDING_WARMUP_MODELS', [SEARCH_MODEL_NAME])
+    for name in names:
+        try:
+            get_model(name)
+        except Exception as e:
+            logger.error(f"Error warming up embedding model {name}: {e}")
+
+
+def model_stats():
+    """Load time and memory of every model loaded in this process."""
+    return {name: dict(stats) for name, stats in _stats.items()}
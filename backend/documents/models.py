@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import FileExtensionValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 try:
     from pgvector.django import VectorField
     PGVECTOR_AVAILABLE = True
@@ -9,6 +11,8 @@ except ImportError:
     PGVECTOR_AVAILABLE = False
 import uuid
 
+from .arabic import chunk_search_text
+
 User = get_user_model()
 
 class Document(models.Model):
@@ -49,6 +53,11 @@ class Document(models.Model):
         default='awaiting_verification',
         help_text='Document verification status in the Tashih workflow'
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text='Weighted tsvector of title (A) and extracted_text (B), maintained by a database trigger'
+    )
 
     class Meta:
         indexes = [
@@ -58,6 +67,7 @@ class Document(models.Model):
             models.Index(fields=['ocr_status']),
             models.Index(fields=['language']),
             models.Index(fields=['verification_status']),
+            GinIndex(fields=['search_vector'], name='document_search_vector_gin'),
         ]
 
 class DocumentVersion(models.Model):
@@ -137,22 +147,83 @@ class TextChunk(models.Model):
     embedding = VectorField(dimensions=768, null=True, blank=True, help_text='Vector embedding of the text chunk') if PGVECTOR_AVAILABLE else models.JSONField(null=True, blank=True, help_text='Vector embedding of the text chunk (stored as JSON for non-PostgreSQL databases)')
     metadata = models.JSONField(default=dict, help_text='Extra info like page number or chapter')
     chunk_index = models.IntegerField(help_text='Index of this chunk within the document')
+    search_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text='Normalized kitab name, author and Arabic content for keyword search'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SEARCH_SOURCE_FIELDS = ('kitab_name', 'author', 'content_arabic')
+
     class Meta:
         indexes = [
             models.Index(fields=['source_document']),
             models.Index(fields=['kitab_name']),
             models.Index(fields=['author']),
             models.Index(fields=['chunk_index']),
+            GinIndex(fields=['search_text'], name='textchunk_search_text_trgm', opclasses=['gin_trgm_ops']),
         ]
         unique_together = ['source_document', 'chunk_index']
 
+    def save(self, *args, **kwargs):
+        self.search_text = chunk_search_text(self.kitab_name, self.author, self.content_arabic)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.SEARCH_SOURCE_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.kitab_name} - Chunk {self.chunk_index}"
 
 
+class KitabStatistics(models.Model):
+    """
+    Materialized chunk count per kitab, so corpus statistics never need a
+    GROUP BY over TextChunk. Refreshed per kitab as books are processed
+    (see documents.corpus_stats).
+    """
+    kitab_name = models.CharField(max_length=255)
+    author = models.CharField(max_length=255)
+    chunk_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['kitab_name', 'author']
+        verbose_name_plural = 'kitab statistics'
+
+    def __str__(self):
+        return f"{self.kitab_name} ({self.chunk_count} chunks)"
+
+
+class ExtractionCache(models.Model):
+    """
+    Per-page extraction result of a file, keyed by its SHA-256 and by a hash
+    of the extractor/OCR configuration that produced it, so re-uploads of the
+    same content skip download and OCR (see documents.extraction_cache).
+    """
+    checksum = models.CharField(max_length=64, help_text='SHA-256 of the file content')
+    config_version = models.CharField(max_length=40, help_text='Hash of the extractor and OCR configuration')
+    config = models.JSONField(default=dict, help_text='Extractor and OCR configuration behind config_version')
+    pages = models.JSONField(default=list, help_text='Per-page text, source and quality')
+    summary = models.JSONField(default=dict, help_text='Extraction summary (pages per source, OCR timing)')
+    metadata = models.JSONField(default=dict, help_text='Document information of the file, e.g. PDF metadata')
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['checksum', 'config_version']
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.checksum[:12]} ({len(self.pages)} pages, {self.config_version})"
+
+
 class DocumentAnalysisStatus(models.Model):
     """Model for tracking various analysis operations on documents."""
     ANALYSIS_TYPES = [
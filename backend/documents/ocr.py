@@ -0,0 +1,208 @@
+"""
+Shared page-level OCR engine.
+
+Every OCR path (``process_document``, ``process_document_ocr`` and the
+``process_books`` command) used to run ``pytesseract.image_to_string`` on
+one page at a time. ``OCREngine`` spreads the pages of a document over a
+bounded pool of ``OCR_WORKERS`` tesseract processes instead and yields the
+results in page order, each with its OCR time.
+
+pytesseract runs every page in its own ``tesseract`` subprocess, so the pool
+is a set of threads that each drive one such process: pages are OCRed on
+separate cores without pickling page images to worker processes, and it
+works inside daemonic Celery prefork children, which may not start a
+``multiprocessing`` pool of their own.
+
+PDFs are rasterized by ``iter_pdf_pages`` in windows of ``OCR_RASTER_WINDOW``
+pages (poppler ``first_page``/``last_page`` ranges). The engine consumes
+pages lazily, keeps at most ``2 * OCR_WORKERS`` in flight and closes each
+image once it is OCRed, so peak memory depends on the window and pool size,
+not on the page count.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANG = 'eng+ara'
+
+
+def _tesseract(image, lang, config):
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+def pdf_page_count(pdf_path):
+    """Number of pages in a PDF, read by poppler's ``pdfinfo``."""
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(str(pdf_path))['Pages'])
+
+
+def _page_windows(page_numbers, window):
+    """Split sorted page numbers into contiguous ``(first, last)`` runs of at most ``window`` pages."""
+    run = []
+    for number in page_numbers:
+        if run and (number != run[-1] + 1 or len(run) >= window):
+            yield run[0], run[-1]
+            run = []
+        run.append(number)
+    if run:
+        yield run[0], run[-1]
+
+
+def iter_pdf_pages(pdf_path, window=None, pages=None, **convert_options):
+    """
+    Yield the pages of a PDF as PIL images, rasterizing ``window`` pages at a
+    time (default ``OCR_RASTER_WINDOW``). ``pages`` restricts it to those
+    1-based page numbers (in ascending order); every page by default.
+    ``convert_options`` (``dpi``, ``output_folder``, ...) are passed to
+    ``pdf2image.convert_from_path``.
+    """
+    from pdf2image import convert_from_path
+
+    window = max(1, window or settings.OCR_RASTER_WINDOW)
+    if pages is None:
+        pages = range(1, pdf_page_count(pdf_path) + 1)
+    for first, last in _page_windows(sorted(pages), window):
+        images = convert_from_path(str(pdf_path), first_page=first, last_page=last, **convert_options)
+        # Hand the pages over one by one so none outlives its OCR
+        images.reverse()
+        while images:
+            yield images.pop()
+
+
+def timing_summary(pages, wall_seconds=None):
+    """Per-document summary of the ``ocr_seconds`` of each page."""
+    seconds = [page['ocr_seconds'] for page in pages]
+    slowest = max(pages, key=lambda page: page['ocr_seconds'], default=None)
+    summary = {
+        'pages': len(seconds),
+        'ocr_seconds': round(sum(seconds), 3),
+        'mean_page_seconds': round(sum(seconds) / len(seconds), 3) if seconds else None,
+        'slowest_page': slowest['page_number'] if slowest else None,
+        'slowest_page_seconds': slowest['ocr_seconds'] if slowest else None,
+    }
+    if wall_seconds is not None:
+        summary['wall_seconds'] = round(wall_seconds, 3)
+        summary['speedup'] = round(sum(seconds) / wall_seconds, 2) if wall_seconds > 0 else None
+    return summary
+
+
+class OCREngine:
+    """Bounded pool of tesseract processes shared by every OCR call in a process."""
+
+    def __init__(self, workers=None, lang=DEFAULT_LANG):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.lang = lang
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        if self.workers > 1:
+            # Tesseract's own OpenMP threads would oversubscribe the cores the
+            # pool already uses; one thread per page process is fastest
+            os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+    def _get_executor(self):
+        # A pool created before a fork has no threads in the child
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _ocr_page(self, page_number, image, lang, config, close=False):
+        start = time.perf_counter()
+        try:
+            text = _tesseract(image, lang, config)
+        finally:
+            if close:
+                image.close()
+        return {
+            'page_number': page_number,
+            'text': text,
+            'ocr_seconds': round(time.perf_counter() - start, 3),
+        }
+
+    def ocr_image(self, image, lang=None, config=''):
+        """OCR a single image in the calling thread; returns its page dict."""
+        return self._ocr_page(1, image, lang or self.lang, config)
+
+    def ocr_pages(self, images, first_page=1, lang=None, config='', close_images=False, page_numbers=None):
+        """
+        OCR an iterable of page images in parallel.
+
+        Yields ``{'page_number', 'text', 'ocr_seconds'}`` dicts in page order,
+        numbered from ``first_page`` or taken from ``page_numbers`` (aligned
+        with ``images``). ``images`` is consumed lazily, at most
+        ``2 * workers`` pages ahead of the page being yielded. With
+        ``close_images`` each image is closed as soon as it has been OCRed.
+        """
+        executor = self._get_executor()
+        lang = lang or self.lang
+        in_flight = deque()
+        try:
+            numbers = page_numbers if page_numbers is not None else itertools.count(first_page)
+            for page_number, image in zip(numbers, images):
+                in_flight.append(
+                    executor.submit(self._ocr_page, page_number, image, lang, config, close_images)
+                )
+                del image
+                if len(in_flight) >= 2 * self.workers:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def ocr_document(self, images, first_page=1, lang=None, config='', close_images=False, page_numbers=None):
+        """
+        OCR every page; returns ``(pages, timing)`` where ``timing`` is the
+        ``timing_summary`` including wall-clock time and parallel speedup.
+        """
+        start = time.perf_counter()
+        pages = list(self.ocr_pages(
+            images, first_page=first_page, lang=lang, config=config,
+            close_images=close_images, page_numbers=page_numbers
+        ))
+        timing = timing_summary(pages, time.perf_counter() - start)
+        logger.info(f"OCR of {timing['pages']} pages with {self.workers} workers: {timing}")
+        return pages, timing
+
+    def ocr_pdf(self, pdf_path, lang=None, config='', window=None, pages=None, **convert_options):
+        """
+        Rasterize and OCR a PDF window by window (only ``pages``, 1-based, if
+        given); returns ``(pages, timing)``. Each page image is freed as soon
+        as it has been OCRed.
+        """
+        if pages is not None:
+            pages = sorted(pages)
+        images = iter_pdf_pages(pdf_path, window=window, pages=pages, **convert_options)
+        return self.ocr_document(images, lang=lang, config=config, close_images=True, page_numbers=pages)
+
+
+def join_pages(pages):
+    return '\n'.join(page['text'] for page in pages)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Return the process-wide OCR engine sized by ``OCR_WORKERS``."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = OCREngine(workers=settings.OCR_WORKERS)
+    return _engine
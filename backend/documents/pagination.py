@@ -0,0 +1,190 @@
+"""
+Pagination for document, chunk and search listings.
+
+Page numbers stay the default (the frontend uses them), but they cost a
+``COUNT(*)`` per page and an OFFSET that grows with depth. Passing
+``?pagination=cursor`` switches to keyset pagination instead: rows are
+ordered by the view's ``keyset_ordering`` (which must end in a unique
+column) and each page continues strictly after the last row of the previous
+one, so every page is an index range scan regardless of depth. The
+``next`` link carries an opaque ``cursor``. ``?count=approximate`` adds a
+total estimated by the PostgreSQL planner instead of counted.
+
+The keyset order is fixed by the view, so ``?ordering=`` is rejected with a
+400 in cursor mode rather than silently ignored.
+"""
+
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldError, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError as RequestValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound('Invalid cursor')
+    if not isinstance(values, list) or not all(
+        value is None or isinstance(value, (str, int, float)) for value in values
+    ):
+        raise NotFound('Invalid cursor')
+    return values
+
+
+def parse_ordering(ordering):
+    """``('-created_at', 'id')`` -> ``[('created_at', True), ('id', False)]``."""
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def keyset_filter(fields, values):
+    """
+    Q object selecting rows strictly after ``values`` in the order given by
+    ``fields`` (the expansion of a row-value comparison).
+    """
+    condition = Q()
+    for i, (name, descending) in enumerate(fields):
+        lookup = 'lt' if descending else 'gt'
+        clause = {prefix: value for (prefix, _), value in zip(fields[:i], values[:i])}
+        clause[f"{name}__{lookup}"] = values[i]
+        condition |= Q(**clause)
+    return condition
+
+
+def approximate_count(queryset):
+    """
+    Row count estimated by the PostgreSQL planner (``EXPLAIN``), without
+    executing the query. Returns None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination with opt-in keyset (cursor) pagination.
+
+    Views set ``keyset_ordering``; the default orders by creation time.
+    Ranked search results are paginated on ``(score, id)`` by setting it to
+    e.g. ``('-rank', '-id')``. Plain lists (already-ranked results built in
+    Python) are supported as long as every keyset field is descending.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    default_keyset_ordering = ('-created_at', '-id')
+
+    def use_keyset(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get('pagination') == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.use_keyset(request)
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = getattr(view, 'keyset_ordering', None) or self.default_keyset_ordering
+        if api_settings.ORDERING_PARAM in request.query_params:
+            raise RequestValidationError({
+                api_settings.ORDERING_PARAM: (
+                    f"Not supported with cursor pagination, which orders by {', '.join(ordering)}"
+                )
+            })
+        fields = parse_ordering(ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        values = decode_cursor(cursor) if cursor else None
+        if values is not None and len(values) != len(fields):
+            raise NotFound('Invalid cursor')
+
+        self.approximate_count = None
+        if isinstance(queryset, list):
+            rows = self._slice_list(queryset, fields, values, page_size)
+            if request.query_params.get('count') == 'approximate':
+                self.approximate_count = len(queryset)
+        else:
+            if request.query_params.get('count') == 'approximate':
+                self.approximate_count = approximate_count(queryset)
+            queryset = queryset.order_by(*ordering)
+            if values is not None:
+                try:
+                    queryset = queryset.filter(keyset_filter(fields, values))
+                except (FieldError, TypeError, ValidationError, ValueError):
+                    raise NotFound('Invalid cursor')
+            rows = list(queryset[:page_size + 1])
+
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = (
+            encode_cursor([getattr(rows[-1], name) for name, _ in fields]) if self.has_next else None
+        )
+        return rows
+
+    def _slice_list(self, items, fields, values, page_size):
+        if not all(descending for _, descending in fields):
+            raise ValueError('Keyset pagination of lists requires descending fields')
+        names = [name for name, _ in fields]
+
+        def key(item):
+            return tuple(_encode_value(getattr(item, name)) for name in names)
+
+        items = sorted(items, key=key, reverse=True)
+        if values is not None:
+            position = tuple(values)
+            try:
+                items = [item for item in items if key(item) < position]
+            except TypeError:  # a cursor value of another type than its field
+                raise NotFound('Invalid cursor')
+        return items[:page_size + 1]
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        response = {'next': self.get_next_link()}
+        if self.approximate_count is not None:
+            response['approximate_count'] = self.approximate_count
+        response['results'] = data
+        return Response(response)
@@ -0,0 +1,207 @@
+"""
+Quantized embedding codes with exact re-scoring.
+
+Two compact representations of the normalised float32 chunk matrix are
+supported:
+
+- ``int8``: each component scaled by 127 and rounded (4x smaller), scored
+  with an int8 dot product.
+- ``binary``: one sign bit per component packed into bytes (32x smaller),
+  scored by Hamming distance.
+
+``binary`` is the default: its Hamming scan (``np.bitwise_count`` over
+64-bit words) is several times faster than exact search. numpy has no int8
+matrix kernel, so int8 codes are widened to float32 block by block and their
+scan is slower than exact search over the float rows; choose int8 only for
+its memory saving and better recall.
+
+Only the codes are held in memory. The top ``limit * rescore_factor``
+candidates by code score are then re-scored exactly against the float rows,
+which usually stay in the memory-mapped embedding store, so only the pages
+of those candidate rows are touched.
+"""
+
+import logging
+
+import numpy as np
+
+from .ann_index import save_npz_atomic
+from .embedding_index import normalize_vector, top_k
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_KINDS = ('int8', 'binary')
+QUANTIZATION_FORMAT_VERSION = 1
+_BLOCK_ROWS = 16384
+
+# Number of set bits in every byte value, for Hamming distance on packed codes
+# with numpy < 2.0 (no np.bitwise_count)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(codes, query_code):
+    """Hamming distance of every packed row of ``codes`` to ``query_code``."""
+    if hasattr(np, 'bitwise_count'):
+        if codes.shape[1] % 8 == 0 and codes.flags.c_contiguous:
+            codes, query_code = codes.view(np.uint64), np.ascontiguousarray(query_code).view(np.uint64)
+        return np.bitwise_count(np.bitwise_xor(codes, query_code)).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1, dtype=np.int32)
+
+
+def quantize_int8(matrix):
+    return np.clip(np.rint(np.asarray(matrix, dtype=np.float32) * 127), -127, 127).astype(np.int8)
+
+
+def quantize_binary(matrix):
+    return np.packbits(np.asarray(matrix) > 0, axis=-1)
+
+
+def _encode(matrix, kind):
+    """Quantize ``matrix`` block by block so a memory map is never fully copied."""
+    quantize = quantize_int8 if kind == 'int8' else quantize_binary
+    blocks = [
+        quantize(matrix[start:start + _BLOCK_ROWS])
+        for start in range(0, matrix.shape[0], _BLOCK_ROWS)
+    ]
+    return np.ascontiguousarray(np.concatenate(blocks)) if blocks else quantize(matrix[:0])
+
+
+class QuantizedEmbeddingIndex:
+    """Candidate generation over quantized codes, re-scored against float rows."""
+
+    def __init__(self, matrix, codes, kind='int8', rescore_factor=10, fingerprint=None):
+        """
+        Args:
+            matrix: Normalised float32 rows used for exact re-scoring.
+            codes: Output of ``quantize_int8`` or ``quantize_binary`` for ``matrix``.
+            kind: ``'int8'`` or ``'binary'``.
+            rescore_factor: Candidates re-scored per requested result.
+        """
+        if kind not in QUANTIZATION_KINDS:
+            raise ValueError(f"Unknown quantization kind {kind!r}")
+        self.matrix = matrix
+        self.codes = codes
+        self.kind = kind
+        self.rescore_factor = rescore_factor
+        self.fingerprint = fingerprint
+        self.recall = None
+
+    @classmethod
+    def build(cls, matrix, kind='int8', rescore_factor=10, fingerprint=None):
+        return cls(matrix, _encode(matrix, kind), kind, rescore_factor, fingerprint)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def candidate_scores(self, query):
+        """Approximate score of every row; higher is better for both kinds."""
+        scores = np.empty(len(self), dtype=np.float32)
+        if self.kind == 'int8':
+            query_code = quantize_int8(query).astype(np.float32)
+            for start in range(0, len(self), _BLOCK_ROWS):
+                block = self.codes[start:start + _BLOCK_ROWS]
+                scores[start:start + block.shape[0]] = block @ query_code
+        else:
+            query_code = quantize_binary(query)
+            for start in range(0, len(self), _BLOCK_ROWS):
+                block = self.codes[start:start + _BLOCK_ROWS]
+                scores[start:start + block.shape[0]] = -hamming_distances(block, query_code)
+        return scores
+
+    def search(self, query_embedding, limit=10, threshold=0.0, rescore_factor=None):
+        """
+        Rank rows by exact cosine among the best quantized candidates.
+
+        Returns:
+            A ``(indices, scores)`` pair of arrays ordered by descending score.
+        """
+        if len(self) == 0 or limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize_vector(query_embedding)
+        scores = self.candidate_scores(query)
+        n_candidates = min(len(self), limit * (rescore_factor or self.rescore_factor))
+        if n_candidates < len(self):
+            candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        else:
+            candidates = np.arange(len(self))
+
+        candidates.sort()  # sequential access into the memory map
+        exact_scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+        best = top_k(exact_scores, limit, threshold)
+        return candidates[best], exact_scores[best]
+
+    def memory_stats(self):
+        float_bytes = int(np.prod(self.matrix.shape)) * 4
+        return {
+            'kind': self.kind,
+            'code_bytes': int(self.codes.nbytes),
+            'float_bytes': float_bytes,
+            'reduction': round(float_bytes / self.codes.nbytes, 1) if self.codes.nbytes else None,
+            'recall_at_10': round(self.recall, 4) if self.recall is not None else None,
+        }
+
+    def save(self, path):
+        save_npz_atomic(
+            path,
+            format_version=np.array(QUANTIZATION_FORMAT_VERSION),
+            fingerprint=np.array(self.fingerprint or ''),
+            kind=np.array(self.kind),
+            codes=self.codes,
+        )
+
+    @classmethod
+    def load(cls, path, matrix, rescore_factor=10):
+        with np.load(path) as data:
+            if int(data['format_version']) != QUANTIZATION_FORMAT_VERSION:
+                raise ValueError(f"Unsupported quantized index version in {path}")
+            return cls(
+                matrix,
+                data['codes'],
+                kind=str(data['kind']),
+                rescore_factor=rescore_factor,
+                fingerprint=str(data['fingerprint']) or None,
+            )
+
+
+def measure_recall(index, exact_index, queries, k=10):
+    """Mean recall@k of ``index`` against exact search over the same rows."""
+    if len(queries) == 0:
+        return None
+    total = 0.0
+    for query in queries:
+        expected, _ = exact_index.search(query, limit=k, threshold=-1.0)
+        found, _ = index.search(query, limit=k, threshold=-1.0)
+        total += len(np.intersect1d(expected, found)) / max(len(expected), 1)
+    return total / len(queries)
+
+
+def sample_queries(matrix, n_queries=50, noise=0.05, seed=0):
+    """Perturbed corpus rows used as representative queries for recall checks."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(n_queries, matrix.shape[0]), replace=False)
+    queries = np.asarray(matrix[np.sort(rows)], dtype=np.float32)
+    return queries + noise * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(matrix.shape[1])
+
+
+def load_or_build(path, matrix, fingerprint, kind='int8', rescore_factor=10):
+    """
+    Load the codes persisted at ``path`` if they match ``fingerprint`` and
+    ``kind``, otherwise quantize ``matrix`` and try to persist the codes.
+    """
+    try:
+        index = QuantizedEmbeddingIndex.load(path, matrix, rescore_factor=rescore_factor)
+        if index.fingerprint == fingerprint and index.kind == kind and len(index) == matrix.shape[0]:
+            return index
+        logger.info(f"Quantized codes {path} are stale, rebuilding")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Error loading quantized codes {path}, rebuilding: {e}")
+
+    index = QuantizedEmbeddingIndex.build(matrix, kind, rescore_factor, fingerprint)
+    try:
+        index.save(path)
+    except OSError as e:
+        logger.warning(f"Could not persist quantized codes to {path}: {e}")
+    return index
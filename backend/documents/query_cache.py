@@ -0,0 +1,196 @@
+"""
+Two-tier cache for query embeddings.
+
+Search traffic is dominated by repeated questions, and encoding the query is
+the largest part of a semantic search request. Vectors are cached per
+(model name, normalised query text) in a bounded in-process LRU, backed by the
+Redis instance already used by Celery so workers share each other's work.
+Redis entries are stored as compact float32 bytes.
+
+The normalised text is also what gets encoded, so a cached vector is exactly
+the one its key would produce. Normalisation keeps case: the search models
+are cased and embed "Zakat" and "zakat" differently.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .batch_encoder import get_batch_encoder
+from .model_registry import SEARCH_MODEL_NAME, get_model
+
+logger = logging.getLogger(__name__)
+
+# After a Redis error the shared tier is skipped for this long
+REDIS_RETRY_SECONDS = 30
+# Part of every key; bumped when normalize_query changes so Redis entries
+# written under the old normalisation are never served
+KEY_VERSION = 2
+
+
+def normalize_query(text):
+    """Canonical form of a query: the cache key and the text that is encoded."""
+    text = unicodedata.normalize('NFKC', text or '')
+    return ' '.join(text.split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of query vectors in front of an optional Redis tier."""
+
+    def __init__(self, max_entries=1024, redis_url=None, ttl=None, key_prefix='qemb'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_disabled_until = 0.0
+        self._counters = {
+            'lru_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'redis_errors': 0,
+        }
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(
+                    redis_url, socket_timeout=0.1, socket_connect_timeout=0.1
+                )
+            except ImportError:
+                logger.warning("redis package not available, query cache is in-process only")
+
+    def _key(self, model_name, text):
+        digest = hashlib.sha256(normalize_query(text).encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}:v{KEY_VERSION}:{model_name}:{digest}"
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _redis_available(self):
+        return self._redis is not None and time.monotonic() >= self._redis_disabled_until
+
+    def _redis_failed(self, e):
+        logger.warning(f"Query embedding cache Redis error, skipping Redis for {REDIS_RETRY_SECONDS}s: {e}")
+        self._redis_disabled_until = time.monotonic() + REDIS_RETRY_SECONDS
+        self._count('redis_errors')
+
+    def get(self, model_name, text):
+        """Return the cached vector for ``text`` or None."""
+        key = self._key(model_name, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self._counters['lru_hits'] += 1
+                return vector
+
+        if self._redis_available():
+            try:
+                payload = self._redis.get(key)
+            except Exception as e:
+                self._redis_failed(e)
+                payload = None
+            if payload is not None:
+                vector = np.frombuffer(payload, dtype=np.float32)
+                self._remember(key, vector)
+                self._count('redis_hits')
+                return vector
+
+        self._count('misses')
+        return None
+
+    def set(self, model_name, text, vector):
+        """Store ``vector`` for ``text`` in both tiers and return it as float32."""
+        key = self._key(model_name, text)
+        vector = np.array(vector, dtype=np.float32).ravel()
+        vector.setflags(write=False)
+        self._remember(key, vector)
+
+        if self._redis_available():
+            try:
+                self._redis.set(key, vector.tobytes(), ex=self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['lru_entries'] = len(self._entries)
+        lookups = stats['lru_hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['lru_hits'] + stats['redis_hits']) / lookups, 4) if lookups else None
+        stats['redis_enabled'] = self._redis is not None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Return the process-wide query embedding cache configured from settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryEmbeddingCache(
+                    max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+                    redis_url=settings.QUERY_EMBEDDING_CACHE_REDIS_URL,
+                    ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+                )
+    return _cache
+
+
+def encode_query(text, model_name=SEARCH_MODEL_NAME):
+    """
+    Embed a search query, reusing a cached vector when one exists.
+
+    Cache misses are encoded through the micro-batching encoder so concurrent
+    requests share a forward pass.
+    """
+    cache = get_query_cache()
+    text = normalize_query(text)
+    vector = cache.get(model_name, text)
+    if vector is None:
+        if settings.QUERY_BATCH_ENABLED:
+            vector = get_batch_encoder(model_name).encode(text)
+        else:
+            vector = get_model(model_name).encode(text)
+        vector = cache.set(model_name, text, vector)
+    return vector
+
+
+def encode_queries(texts, model_name=SEARCH_MODEL_NAME):
+    """
+    Embed several queries, encoding all cache misses in one batched call.
+
+    Returns a list of vectors aligned with ``texts``.
+    """
+    cache = get_query_cache()
+    texts = [normalize_query(text) for text in texts]
+    vectors = [cache.get(model_name, text) for text in texts]
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        encoded = get_model(model_name).encode(missing, batch_size=len(missing))
+        by_text = {text: cache.set(model_name, text, vector) for text, vector in zip(missing, encoded)}
+        vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+    return vectors
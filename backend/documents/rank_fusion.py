@@ -0,0 +1,33 @@
+"""
+Reciprocal rank fusion (RRF) of ranked result lists.
+
+Each retriever contributes ``weight / (k + rank)`` to every item it returned,
+with ranks starting at 1. Only positions are used, so keyword ranks and cosine
+similarities never have to be put on a common scale.
+"""
+
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=DEFAULT_RRF_K):
+    """
+    Fuse several rankings into one.
+
+    Args:
+        rankings: Mapping of retriever name to a best-first list of item ids.
+        weights: Optional mapping of retriever name to weight (default 1.0).
+        k: Damping constant; larger values flatten the head of each list.
+
+    Returns:
+        A list of ``(item_id, score)`` pairs, best first. Ties keep the order
+        in which items were first seen.
+    """
+    weights = weights or {}
+    scores = {}
+    for name, ranked_ids in rankings.items():
+        weight = weights.get(name, 1.0)
+        if weight <= 0:
+            continue
+        for rank, item_id in enumerate(ranked_ids, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,225 @@
+"""
+Background loading of the semantic search models and corpus, and the
+readiness gate in front of the search endpoints.
+
+Loading the sentence-transformer models and the kitab corpus takes from
+seconds to minutes (model download, JSON parse). ``start_loading`` runs them
+in daemon threads so process start, health probes and keyword search never
+wait for them. Each component reports ``pending``/``loading``/``ready``/
+``failed`` with bytes and elapsed time; while a component a search depends
+on is still loading, ``not_ready_response`` answers immediately with
+``503`` and ``Retry-After`` instead of queueing the request behind the load.
+
+Web processes start the ``SEMANTIC_SEARCH_PRELOAD`` components from the
+WSGI/ASGI entry points (``preload``), so management commands and Celery
+never start loader threads; other components load on first use. A data
+directory without a JSON corpus leaves ``corpus`` ``not_configured``, which
+counts as ready: Postgres-only deployments do not need it.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .corpus import corpus_size, corpus_version, get_corpus_manager
+from .model_registry import SEARCH_MODEL_NAME, get_model, model_stats
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+NOT_CONFIGURED = 'not_configured'
+# States a search no longer waits for
+SETTLED = (READY, NOT_CONFIGURED)
+
+MODELS = 'models'
+CORPUS = 'corpus'
+
+
+class NotConfigured(Exception):
+    """The component has nothing to load in this deployment."""
+
+
+class ComponentState:
+    """Progress of one background load."""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = PENDING
+        self.pid = os.getpid()
+        self.bytes_total = None
+        self.bytes_loaded = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def start(self, bytes_total=None):
+        self.state = LOADING
+        self.bytes_total = bytes_total
+        self.started_at = time.monotonic()
+
+    def finish(self, bytes_loaded=None, error=None, state=None):
+        self.finished_at = time.monotonic()
+        self.error = error
+        self.state = state or (FAILED if error else READY)
+        if bytes_loaded is not None:
+            self.bytes_loaded = bytes_loaded
+
+    def elapsed(self):
+        if self.started_at is None:
+            return None
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return round(end - self.started_at, 3)
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'bytes_loaded': self.bytes_loaded,
+            'bytes_total': self.bytes_total,
+            'elapsed_seconds': self.elapsed(),
+            'error': self.error,
+        }
+
+
+_components = {}
+_lock = threading.Lock()
+
+
+def _warm_up_models():
+    names = list(getattr(settings, 'EMBEDDING_WARMUP_MODELS', []))
+    if SEARCH_MODEL_NAME not in names:
+        names.insert(0, SEARCH_MODEL_NAME)
+    for name in names:
+        get_model(name)
+    stats = model_stats()
+    return sum(stats[name]['memory_bytes'] or 0 for name in names if name in stats)
+
+
+def _load_corpus():
+    if corpus_version(settings.SEMANTIC_SEARCH_DATA_DIR) is None:
+        raise NotConfigured(f"No search corpus in {settings.SEMANTIC_SEARCH_DATA_DIR}")
+    with get_corpus_manager().acquire() as corpus:
+        if corpus is None:
+            raise RuntimeError("The search corpus could not be loaded")
+        return int(corpus.chunk_index.matrix.nbytes)
+
+
+LOADERS = {
+    MODELS: _warm_up_models,
+    CORPUS: _load_corpus,
+}
+
+
+def _run(component, loader):
+    try:
+        bytes_loaded = loader()
+    except NotConfigured as e:
+        logger.info(f"{component.name} is not configured: {e}")
+        component.finish(error=str(e), state=NOT_CONFIGURED)
+        return
+    except Exception as e:
+        logger.error(f"Background loading of {component.name} failed after {component.elapsed()}s: {e}")
+        component.finish(error=str(e))
+        return
+    component.finish(bytes_loaded=bytes_loaded)
+    logger.info(f"Background loading of {component.name} finished in {component.elapsed()}s")
+
+
+def _needs_start(component):
+    if component is None:
+        return True
+    if component.state == READY:
+        return False
+    if component.state in (FAILED, NOT_CONFIGURED):
+        # Retry a failed load (or look for a new corpus), but not on every request
+        return time.monotonic() - component.finished_at >= settings.SEMANTIC_SEARCH_RETRY_AFTER
+    # A load started before a fork has no thread in this process
+    return component.pid != os.getpid()
+
+
+def start_loading(components=(MODELS, CORPUS)):
+    """
+    Start loading ``components`` in background threads, once per process.
+    Threads do not survive fork, so a worker forked while the parent was
+    still loading starts over (components already loaded before the fork
+    are inherited as they are). Failed loads are retried after
+    ``SEMANTIC_SEARCH_RETRY_AFTER`` seconds.
+    """
+    if not any(_needs_start(_components.get(name)) for name in components):
+        return
+    with _lock:
+        for name in components:
+            if not _needs_start(_components.get(name)):
+                continue
+            component = _components[name] = ComponentState(name)
+            component.start(corpus_size(settings.SEMANTIC_SEARCH_DATA_DIR) if name == CORPUS else None)
+            threading.Thread(
+                target=_run, args=(component, LOADERS[name]), name=f'load-{name}', daemon=True
+            ).start()
+
+
+def preload_components():
+    return [name for name in settings.SEMANTIC_SEARCH_PRELOAD if name in LOADERS]
+
+
+def preload():
+    """Start the ``SEMANTIC_SEARCH_PRELOAD`` components; called by the WSGI/ASGI entry points."""
+    start_loading(preload_components())
+
+
+def _resume_after_fork():
+    # Servers that import the application before forking (gunicorn --preload)
+    # leave the children with loads whose threads stayed in the parent
+    global _lock
+    _lock = threading.Lock()
+    unfinished = [name for name, component in _components.items() if component.state in (PENDING, LOADING)]
+    if unfinished:
+        start_loading(unfinished)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_resume_after_fork)
+
+
+def readiness(components=None):
+    """
+    State of ``components`` (every started component by default) and
+    whether all of them are ready or not configured.
+    """
+    names = list(_components) if components is None else list(components)
+    states = {name: _components[name].to_dict() for name in names if name in _components}
+    return {
+        'ready': len(states) == len(names) and all(c['state'] in SETTLED for c in states.values()),
+        'loading': any(c['state'] in (PENDING, LOADING) for c in states.values()),
+        'components': states,
+    }
+
+
+def not_ready_response(components=(MODELS, CORPUS)):
+    """
+    503 with ``Retry-After`` if any of ``components`` is still loading, else
+    None. A failed or not configured component does not block: the request
+    then loads it synchronously (retrying) and reports its own error.
+    """
+    start_loading(components)
+    loading = [
+        name for name in components
+        if name in _components and _components[name].state in (PENDING, LOADING)
+    ]
+    if not loading:
+        return None
+    return Response(
+        {
+            'error': f"Semantic search is starting up ({', '.join(loading)} loading), retry shortly",
+            'readiness': readiness(),
+        },
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(settings.SEMANTIC_SEARCH_RETRY_AFTER)},
+    )
@@ -5,7 +5,30 @@ from core.storage import generate_gcs_signed_url
 import mimetypes
 import hashlib
 import os
-import re
+
+
+def requested_fields(request):
+    """
+    Field names from a ``?fields=id,title,...`` sparse fieldset parameter,
+    or None when the parameter is absent.
+    """
+    if request is None:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """Drop serializer fields not named in the request's ``fields`` parameter."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
 
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -61,64 +84,35 @@ class TextChunkSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class DocumentSearchSerializer(DocumentSerializer):
+class DocumentListSerializer(SparseFieldsetMixin, DocumentSerializer):
+    """Lightweight read serializer for document lists; omits ocr_result."""
+
+    class Meta(DocumentSerializer.Meta):
+        fields = [field for field in DocumentSerializer.Meta.fields if field != 'ocr_result']
+        # Model columns behind fields whose names differ, for ?fields= projections
+        field_sources = {
+            'file_url': 'file_path',
+            'created_by': 'created_by__username',
+        }
+
+
+class DocumentSearchSerializer(DocumentListSerializer):
     """Enhanced serializer for search results with snippets and relevance scores."""
     snippet = serializers.SerializerMethodField()
     search_rank = serializers.SerializerMethodField()
     similarity_score = serializers.SerializerMethodField()
+    fusion_score = serializers.SerializerMethodField()
     
-    class Meta(DocumentSerializer.Meta):
-        fields = DocumentSerializer.Meta.fields + ['snippet', 'search_rank', 'similarity_score']
+    class Meta(DocumentListSerializer.Meta):
+        fields = DocumentListSerializer.Meta.fields + ['snippet', 'search_rank', 'similarity_score', 'fusion_score']
     
     def get_snippet(self, obj):
-        """Generate a text snippet around the search terms."""
-        query = self.context.get('search_query', '')
-        text = getattr(obj, 'extracted_text', '') or ''
-        
-        if not query or not text:
-            # Return first 200 characters as fallback
-            return text[:200] + '...' if len(text) > 200 else text
-        
-        # Find the first occurrence of any query term
-        query_terms = re.findall(r'\w+', query.lower())
-        text_lower = text.lower()
-        
-        best_position = len(text)
-        for term in query_terms:
-            position = text_lower.find(term)
-            if position != -1 and position < best_position:
-                best_position = position
-        
-        if best_position == len(text):
-            # No terms found, return beginning
-            return text[:200] + '...' if len(text) > 200 else text
-        
-        # Extract snippet around the found term
-        snippet_length = 300
-        start = max(0, best_position - snippet_length // 2)
-        end = min(len(text), start + snippet_length)
-        
-        # Adjust start to avoid cutting words
-        if start > 0:
-            space_before = text.rfind(' ', 0, start)
-            if space_before != -1 and start - space_before < 20:
-                start = space_before + 1
-        
-        # Adjust end to avoid cutting words
-        if end < len(text):
-            space_after = text.find(' ', end)
-            if space_after != -1 and space_after - end < 20:
-                end = space_after
-        
-        snippet = text[start:end]
-        
-        # Add ellipsis if needed
-        if start > 0:
-            snippet = '...' + snippet
-        if end < len(text):
-            snippet = snippet + '...'
-        
-        return snippet
+        """
+        Return the ts_headline snippet the search view attached to the page.
+        There is no fallback built from extracted_text: search defers it, so
+        reading it here would fetch the full text of every row one by one.
+        """
+        return getattr(obj, 'headline', None)
     
     def get_search_rank(self, obj):
         """Get the search rank if available (for keyword search)."""
@@ -127,6 +121,10 @@ class DocumentSearchSerializer(DocumentSerializer):
     def get_similarity_score(self, obj):
         """Get the similarity score if available (for semantic search)."""
         return getattr(obj, 'similarity', None)
+    
+    def get_fusion_score(self, obj):
+        """Get the reciprocal rank fusion score if available (for hybrid search)."""
+        return getattr(obj, 'fusion_score', None)
 
     def get_file_url(self, obj):
         """Generate a signed URL for the version file."""
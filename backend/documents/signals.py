@@ -0,0 +1,49 @@
+"""
+Keep ``KitabStatistics`` in step with chunk writes outside ``process_books``.
+
+Saving a chunk (API, admin, shell) recounts its kitab, and the old one if
+the chunk moved to another kitab or author. Deleting a document recounts
+the kitabs its chunks belonged to. There is deliberately no ``post_delete``
+receiver on ``TextChunk``: it would turn every cascade from ``Document``
+into a row-by-row delete that loads each chunk and its embedding. Single
+chunk deletes refresh from the viewset and the admin instead.
+"""
+
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .corpus_stats import schedule_kitab_statistics_refresh
+from .models import Document, TextChunk
+
+STATISTICS_KEY_FIELDS = {'kitab_name', 'author'}
+
+
+@receiver(pre_save, sender=TextChunk)
+def remember_statistics_key(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._statistics_key_before = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not STATISTICS_KEY_FIELDS & set(update_fields):
+        return
+    instance._statistics_key_before = (
+        TextChunk.objects.filter(pk=instance.pk).values_list('kitab_name', 'author').first()
+    )
+
+
+@receiver(post_save, sender=TextChunk)
+def refresh_statistics_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    key = (instance.kitab_name, instance.author)
+    before = getattr(instance, '_statistics_key_before', None)
+    if created:
+        schedule_kitab_statistics_refresh([key])
+    elif before is not None and tuple(before) != key:
+        schedule_kitab_statistics_refresh([tuple(before), key])
+
+
+@receiver(pre_delete, sender=Document)
+def refresh_statistics_on_document_delete(sender, instance, **kwargs):
+    schedule_kitab_statistics_refresh(
+        TextChunk.objects.filter(source_document=instance).values_list('kitab_name', 'author').distinct()
+    )
@@ -2,9 +2,14 @@ from celery import shared_task
 from django.conf import settings
 from .models import Document, SemanticTopic, ArgumentComponent, DocumentAnalysisStatus
 from vectors.models import Embedding
+from .model_registry import DOCUMENT_MODEL_NAME
+from .extraction_cache import KIND_IMAGE, KIND_PDF, extract_with_cache
+from .ocr import join_pages
 from django.contrib.contenttypes.models import ContentType
+from contextlib import contextmanager
 import logging
 import hashlib
+import mimetypes
 import tempfile
 import os
 from django.core.files.storage import default_storage
@@ -30,7 +35,7 @@ def process_document(self, document_id):
         
         logger.info(f'Starting processing for document: {document_id}')
         
-        # Step 1: Download from GCS and extract text
+        # Step 1: Extract text (downloaded and OCRed only if this content is not cached)
         extracted_text = extract_text_from_document(document)
         if not extracted_text:
             raise Exception("Failed to extract text from document")
@@ -53,7 +58,7 @@ def process_document(self, document_id):
                     'embedding': embedding_vector,
                     'embedding_type': 'sentence-transformers',
                     'metadata': {
-                        'model_name': 'paraphrase-multilingual-MiniLM-L12-v2',
+                        'model_name': DOCUMENT_MODEL_NAME,
                         'text_length': len(extracted_text),
                         'processed_at': timezone.now().isoformat()
                     }
@@ -83,86 +88,70 @@ def process_document(self, document_id):
         raise self.retry(exc=exc, countdown=60 * 5)  # Retry after 5 minutes
 
 
+@contextmanager
+def downloaded_blob(blob_path):
+    """Download a blob from Azure Blob Storage to a temporary file; yields its path."""
+    from azure.storage.blob import BlobServiceClient
+
+    blob_service_client = BlobServiceClient(
+        account_url=f"https://{settings.AZURE_ACCOUNT_NAME}.blob.core.windows.net",
+        credential=settings.AZURE_ACCOUNT_KEY
+    )
+    blob_client = blob_service_client.get_blob_client(
+        container=settings.AZURE_CONTAINER_NAME,
+        blob=blob_path
+    )
+    
+    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
+        blob_data = blob_client.download_blob().readall()
+        tmp_file.write(blob_data)
+        tmp_file.flush()
+        file_path = tmp_file.name
+    
+    try:
+        yield file_path
+    finally:
+        # Clean up temporary file
+        try:
+            os.unlink(file_path)
+        except OSError:
+            pass
+
+
+def extract_document_pages(document):
+    """
+    Per-page extraction of a document's file, served from the extraction
+    cache when the same content (``document.checksum``) was already
+    extracted; the file is only downloaded on a miss.
+    
+    Returns an ``ExtractionCache`` entry, or None for unsupported file types.
+    """
+    mime_type, _ = mimetypes.guess_type(document.file_path)
+    if mime_type and mime_type.startswith('image'):
+        kind = KIND_IMAGE
+    elif mime_type == 'application/pdf':
+        kind = KIND_PDF
+    else:
+        logger.warning(f"Unsupported file type for text extraction: {mime_type}")
+        return None
+    
+    # PDF pages with a usable text layer are kept; the others are rasterized
+    # a window at a time and OCRed in parallel
+    return extract_with_cache(
+        document.checksum,
+        kind,
+        lambda: downloaded_blob(document.file_path),
+        expect_arabic=document.language == 'ar'
+    )
+
+
 def extract_text_from_document(document):
     """Extract text from document using OCR."""
     try:
-        from azure.storage.blob import BlobServiceClient
-        import mimetypes
-        import pytesseract
-        from pdf2image import convert_from_path
-        from PIL import Image
-        import PyPDF2
-        
-        # Download file from Azure Blob Storage
-        blob_service_client = BlobServiceClient(
-            account_url=f"https://{settings.AZURE_ACCOUNT_NAME}.blob.core.windows.net",
-            credential=settings.AZURE_ACCOUNT_KEY
-        )
-        blob_client = blob_service_client.get_blob_client(
-            container=settings.AZURE_CONTAINER_NAME,
-            blob=document.file_path
-        )
-        
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            blob_data = blob_client.download_blob().readall()
-            tmp_file.write(blob_data)
-            tmp_file.flush()
-            file_path = tmp_file.name
-        
-        mime_type, _ = mimetypes.guess_type(document.file_path)
-        extracted_text = ''
-        
-        try:
-            if mime_type and mime_type.startswith('image'):
-                img = Image.open(file_path)
-                text = pytesseract.image_to_string(img, lang='eng+ara')
-                extracted_text = text
-                
-            elif mime_type == 'application/pdf':
-                # Try to extract text directly first (for text-based PDFs)
-                try:
-                    with open(file_path, 'rb') as f:
-                        pdf_reader = PyPDF2.PdfReader(f)
-                        text_pages = []
-                        for page in pdf_reader.pages:
-                            text_pages.append(page.extract_text())
-                        
-                        direct_text = '\n'.join(text_pages).strip()
-                        
-                        # If we got substantial text, use it
-                        if len(direct_text) > 100:
-                            extracted_text = direct_text
-                        else:
-                            # Fall back to OCR for image-based PDFs
-                            images = convert_from_path(file_path)
-                            ocr_texts = []
-                            for img in images:
-                                text = pytesseract.image_to_string(img, lang='eng+ara')
-                                ocr_texts.append(text)
-                            extracted_text = '\n'.join(ocr_texts)
-                            
-                except Exception as e:
-                    logger.warning(f"PDF text extraction failed, falling back to OCR: {str(e)}")
-                    # Fall back to OCR
-                    images = convert_from_path(file_path)
-                    ocr_texts = []
-                    for img in images:
-                        text = pytesseract.image_to_string(img, lang='eng+ara')
-                        ocr_texts.append(text)
-                    extracted_text = '\n'.join(ocr_texts)
-            
-            else:
-                logger.warning(f"Unsupported file type for text extraction: {mime_type}")
-                extracted_text = ''
-                
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(file_path)
-            except:
-                pass
-        
-        return extracted_text.strip()
+        extraction = extract_document_pages(document)
+        if extraction is None:
+            return ''
+        return join_pages(extraction.pages).strip()
         
     except Exception as e:
         logger.error(f"Error extracting text from document {document.id}: {str(e)}")
@@ -176,10 +165,10 @@ def generate_document_embedding(text):
             logger.warning("Text too short for embedding generation")
             return None
             
-        from sentence_transformers import SentenceTransformer
+        from .model_registry import get_model
         
-        # Load the multilingual model
-        model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        # Shared multilingual model, loaded once per worker process
+        model = get_model(DOCUMENT_MODEL_NAME)
         
         # Generate embedding
         # Truncate text if too long (model has token limits)
@@ -257,63 +246,27 @@ def create_analysis_stubs(document):
 def process_document_ocr(self, document_id):
     """Process document OCR asynchronously."""
     try:
-        from azure.storage.blob import BlobServiceClient
-        import tempfile
-        import mimetypes
-        import pytesseract
-        from pdf2image import convert_from_path
-        from PIL import Image
-        import PyPDF2
-        
         document = Document.objects.get(id=document_id)
         document.ocr_status = 'processing'
         document.save()
         
-        # Download file from Azure Blob Storage
-        blob_service_client = BlobServiceClient(
-            account_url=f"https://{settings.AZURE_ACCOUNT_NAME}.blob.core.windows.net",
-            credential=settings.AZURE_ACCOUNT_KEY
-        )
-        blob_client = blob_service_client.get_blob_client(
-            container=settings.AZURE_CONTAINER_NAME,
-            blob=document.file_path
-        )
-        
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            blob_data = blob_client.download_blob().readall()
-            tmp_file.write(blob_data)
-            tmp_file.flush()
-            file_path = tmp_file.name
-        
-        mime_type, _ = mimetypes.guess_type(document.file_path)
-        ocr_text = ''
+        # Served from the extraction cache when this content was seen before;
+        # DOCX and other formats are not extracted
+        extraction = extract_document_pages(document)
         pages_result = []
-        if mime_type and mime_type.startswith('image'):
-            img = Image.open(file_path)
-            text = pytesseract.image_to_string(img, lang='eng+ara')
-            ocr_text = text
-            pages_result.append({'page_number': 1, 'text': text, 'confidence': 1.0})
-        elif mime_type == 'application/pdf':
-            images = convert_from_path(file_path)
-            for i, img in enumerate(images):
-                text = pytesseract.image_to_string(img, lang='eng+ara')
-                ocr_text += text + '\n'
-                pages_result.append({'page_number': i+1, 'text': text, 'confidence': 1.0})
-        else:
-            # For DOCX or other formats, skip or add support as needed
-            ocr_text = ''
-        # Metadata extraction (PDF example)
         metadata = {}
-        if mime_type == 'application/pdf':
-            with open(file_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                info = pdf_reader.metadata
-                metadata = {k[1:]: v for k, v in info.items() if k.startswith('/')}
+        summary = None
+        if extraction is not None:
+            pages_result = [{**page, 'confidence': 1.0} for page in extraction.pages]
+            metadata = extraction.metadata
+            summary = {**extraction.summary, 'cached': extraction.cache_hit}
+        ocr_text = ''.join(page['text'] + '\n' for page in pages_result)
         # Update document with OCR results
         document.ocr_status = 'completed'
         document.ocr_result = {
             'text': ocr_text,
             'pages': pages_result,
+            'extraction': summary,
         }
         document.metadata = metadata
         document.save()
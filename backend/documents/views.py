@@ -3,33 +3,89 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import APIException
 from django.shortcuts import get_object_or_404
 from django.core.files.storage import default_storage
 from django.conf import settings
-from django.db import models
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.db import models, connection, connections, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 import hashlib
 import os
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 from .models import Document, DocumentVersion, DocumentAnnotation, DocumentCrossReference, TextChunk
 from .serializers import (
     DocumentSerializer, DocumentVersionSerializer,
     DocumentAnnotationSerializer, DocumentCrossReferenceSerializer,
     DocumentUploadSerializer, DocumentSearchSerializer,
-    TextChunkSerializer
+    DocumentListSerializer, TextChunkSerializer, requested_fields
 )
+from .filters import ArabicSearchFilter
+from .pagination import KeysetPageNumberPagination
 from .tasks import process_document
 from core.storage import generate_gcs_signed_url
-from sentence_transformers import SentenceTransformer
 import numpy as np
+from .embedding_index import ChunkEmbeddingIndex
+from .model_registry import SEARCH_MODEL_NAME, DOCUMENT_MODEL_NAME
+from .query_cache import encode_query
+from .readiness import MODELS, not_ready_response
+from .rank_fusion import reciprocal_rank_fusion
+from .corpus_stats import (
+    conditional_response, database_statistics, database_statistics_etag, schedule_kitab_statistics_refresh
+)
+try:
+    from pgvector.django import CosineDistance
+except ImportError:
+    CosineDistance = None
 
 logger = logging.getLogger(__name__)
 
-class DocumentPagination(PageNumberPagination):
+# Columns only detail views need: full text, OCR output and vectors
+LARGE_FIELDS = ('extracted_text', 'ocr_result', 'embedding', 'search_vector')
+
+# pgvector rejects hnsw.ef_search values above this
+HNSW_MAX_EF_SEARCH = 1000
+
+# Keyset (score, id) orderings for cursor-paginated search results
+SEARCH_KEYSET_ORDERING = {
+    'keyword': ('-rank', '-id'),
+    'semantic': ('-similarity', '-id'),
+    'hybrid': ('-fusion_score', '-id'),
+}
+
+_binary_quantize_support = {}
+
+def binary_quantize_supported(using='default'):
+    """
+    Whether the pgvector extension has ``binary_quantize()`` (>= 0.7.0);
+    migration 0003 skips the binary index on older versions. Checked once
+    per database and process.
+    """
+    if using not in _binary_quantize_support:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        version = tuple(int(part) for part in re.findall(r'\d+', row[0])[:3]) if row else ()
+        _binary_quantize_support[using] = version >= (0, 7, 0)
+    return _binary_quantize_support[using]
+
+def projected_columns(requested):
+    """Model columns needed to serialize the ``?fields=`` names in ``requested``."""
+    sources = DocumentListSerializer.Meta.field_sources
+    model_fields = {field.name for field in Document._meta.concrete_fields}
+    columns = {'id'}
+    for name in requested:
+        source = sources.get(name, name)
+        if source.split('__')[0] in model_fields and source not in LARGE_FIELDS:
+            columns.add(source)
+    return columns
+
+class DocumentPagination(KeysetPageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -46,14 +102,47 @@ class DocumentViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'updated_at', 'title']
     ordering = ['-created_at']
+    # Columns loaded per action; actions not listed load full rows
+    queryset_profiles = {
+        'list': {'defer': LARGE_FIELDS},
+        'search': {'defer': LARGE_FIELDS},
+        'download': {'only': ('id', 'created_by', 'is_public', 'file_path')},
+        'ocr_status': {'only': ('id', 'created_by', 'is_public', 'ocr_status', 'ocr_result')},
+    }
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Document.objects.all().select_related('created_by')
-        return Document.objects.filter(
-            models.Q(created_by=user) | models.Q(is_public=True)
-        ).select_related('created_by')
+            queryset = Document.objects.all().select_related('created_by')
+        else:
+            queryset = Document.objects.filter(
+                models.Q(created_by=user) | models.Q(is_public=True)
+            ).select_related('created_by')
+        return self._apply_projection(queryset)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return DocumentListSerializer
+        return super().get_serializer_class()
+
+    def _apply_projection(self, queryset):
+        """
+        Load only the columns the current action needs. On list and search,
+        a ``?fields=`` sparse fieldset narrows the rows to those fields.
+        """
+        profile = self.queryset_profiles.get(self.action)
+        if profile is None:
+            return queryset
+        if 'only' in profile:
+            return queryset.only(*profile['only'])
+        
+        requested = requested_fields(self.request)
+        if not requested:
+            return queryset.defer(*profile['defer'])
+        columns = projected_columns(requested)
+        if 'created_by__username' not in columns:
+            queryset = queryset.select_related(None)
+        return queryset.only(*columns)
 
     @action(detail=False, methods=['post'], url_path='upload', url_name='upload', permission_classes=[IsAuthenticated], parser_classes=[MultiPartParser, FormParser])
     def upload(self, request):
@@ -102,9 +191,15 @@ class DocumentViewSet(viewsets.ModelViewSet):
         
         Query parameters:
         - q: The search query string
-        - type: 'keyword' or 'semantic' (defaults to 'keyword')
+        - type: 'keyword', 'semantic' or 'hybrid' (defaults to 'keyword')
+        - keyword_weight, semantic_weight: RRF weights for type=hybrid
+          (default: HYBRID_KEYWORD_WEIGHT / HYBRID_SEMANTIC_WEIGHT)
+        - fields: Comma-separated sparse fieldset, e.g. id,title,snippet
         - page: Page number for pagination
         - page_size: Number of results per page
+        - pagination=cursor / cursor: keyset pagination on (score, id);
+          count=approximate adds a planner-estimated total. ordering is
+          rejected in this mode
         """
         query_string = request.query_params.get('q', '').strip()
         search_type = request.query_params.get('type', 'keyword').lower()
@@ -114,20 +209,39 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 'error': 'Query parameter "q" is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if search_type in ('semantic', 'hybrid'):
+            unavailable = not_ready_response((MODELS,))
+            if unavailable is not None:
+                return unavailable
+        
         # Get the base queryset with proper permissions
         queryset = self.get_queryset().filter(
             ocr_status='completed',  # Only search completed documents
             extracted_text__isnull=False  # Only documents with extracted text
         ).exclude(extracted_text='')
+        requested = requested_fields(request)
+        snippets = requested is None or 'snippet' in requested
+        
+        # Cursor pagination of ranked results continues on (score, id)
+        self.keyset_ordering = SEARCH_KEYSET_ORDERING.get(search_type, SEARCH_KEYSET_ORDERING['keyword'])
         
         try:
             if search_type == 'semantic':
                 results = self._perform_semantic_search(queryset, query_string)
+            elif search_type == 'hybrid':
+                weights = {
+                    'keyword': float(request.query_params.get('keyword_weight', settings.HYBRID_KEYWORD_WEIGHT)),
+                    'semantic': float(request.query_params.get('semantic_weight', settings.HYBRID_SEMANTIC_WEIGHT)),
+                }
+                results = self._perform_hybrid_search(queryset, query_string, weights)
             else:  # Default to keyword search
                 results = self._perform_keyword_search(queryset, query_string)
             
             # Apply pagination
             page = self.paginate_queryset(results)
+            # Headlines are costly, so they are computed for the returned rows only
+            if snippets:
+                self._attach_snippets(page if page is not None else results, queryset, query_string)
             search_context = {
                 'request': request, 
                 'search_query': query_string
@@ -144,26 +258,63 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 'query': query_string
             })
             
+        except APIException:
+            # Invalid cursor or ordering: the client's error, not a failed search
+            raise
         except Exception as e:
             logger.error(f"Search failed: {str(e)}")
             return Response({
                 'error': 'Search failed. Please try again.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _with_snippets(self, queryset, query_string):
+        """
+        Compute each result's snippet in PostgreSQL with ts_headline, so
+        extracted_text itself (deferred for search) never leaves the database.
+        Apply it to the rows of one page only (see ``_attach_snippets``).
+        """
+        return queryset.annotate(
+            headline=SearchHeadline(
+                'extracted_text',
+                SearchQuery(query_string),
+                start_sel='<mark>',
+                stop_sel='</mark>',
+                max_words=35,
+                min_words=15,
+                max_fragments=2,
+                fragment_delimiter=' ... '
+            )
+        )
+    
+    def _attach_snippets(self, documents, queryset, query_string):
+        """
+        Set the ts_headline snippet on already fetched ``documents``, with one
+        query computing it for just those rows.
+        """
+        headlines = dict(
+            self._with_snippets(queryset.filter(pk__in=[document.pk for document in documents]), query_string)
+            .values_list('pk', 'headline')
+        )
+        for document in documents:
+            document.headline = headlines.get(document.pk)
+    
     def _perform_keyword_search(self, queryset, query_string):
         """
         Perform full-text search using PostgreSQL's text search capabilities.
+        
+        Matches against the stored, GIN-indexed ``search_vector`` column
+        (title weighted A, extracted text weighted B), which a database
+        trigger keeps current, so documents are not re-tokenized per query.
         """
-        # Create search vector and query
-        search_vector = SearchVector('title', weight='A') + SearchVector('extracted_text', weight='B')
         search_query = SearchQuery(query_string)
         
-        # Perform the search with ranking
+        # Perform the search with ranking. ts_rank returns real; as double
+        # precision the rank round-trips exactly through a keyset cursor, so
+        # the last row of a page is not repeated on the next one
         results = queryset.annotate(
-            search=search_vector,
-            rank=SearchRank(search_vector, search_query)
+            rank=Cast(SearchRank(models.F('search_vector'), search_query), models.FloatField())
         ).filter(
-            search=search_query
+            search_vector=search_query
         ).order_by('-rank', '-created_at')
         
         return results
@@ -173,23 +324,20 @@ class DocumentViewSet(viewsets.ModelViewSet):
         Perform semantic search using vector similarity with pgvector.
         """
         try:
-            # Generate embedding for the query
-            model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-            query_embedding = model.encode([query_string])[0].tolist()
+            # Generate embedding for the query (cached for repeated queries)
+            query_embedding = encode_query(query_string, DOCUMENT_MODEL_NAME).tolist()
+            
+            if CosineDistance is None:
+                raise ImportError("pgvector is not installed")
             
             # Only include documents that have embeddings
             queryset = queryset.filter(embedding__isnull=False)
             
-            # Use pgvector's cosine distance operator
-            # <=> is the cosine distance operator in pgvector
-            results = queryset.extra(
-                select={
-                    'similarity': '1 - (embedding <=> %s)'
-                },
-                select_params=[query_embedding],
-                where=['embedding IS NOT NULL'],
-                order_by=['-similarity', '-created_at']
-            )
+            # Use pgvector's cosine distance operator (<=>); as an annotation
+            # the similarity can also be filtered on for keyset pagination
+            results = queryset.annotate(
+                similarity=1 - CosineDistance('embedding', query_embedding)
+            ).order_by('-similarity', '-created_at')
             
             return results
             
@@ -200,6 +348,63 @@ class DocumentViewSet(viewsets.ModelViewSet):
             logger.error(f"Semantic search failed: {str(e)}")
             raise
 
+    def _perform_hybrid_search(self, queryset, query_string, weights):
+        """
+        Run keyword and semantic retrieval concurrently, each capped at
+        HYBRID_CANDIDATE_BUDGET documents, and fuse them with weighted
+        reciprocal rank fusion. Returns a best-first list of documents
+        carrying ``rank``, ``similarity`` and ``fusion_score`` attributes.
+        """
+        budget = settings.HYBRID_CANDIDATE_BUDGET
+        
+        def keyword_candidates():
+            results = self._perform_keyword_search(queryset, query_string)
+            return list(results.values_list('pk', 'rank')[:budget])
+        
+        def semantic_candidates():
+            results = self._perform_semantic_search(queryset, query_string)
+            return list(results.values_list('pk', 'similarity')[:budget])
+        
+        def run(retriever):
+            # Each thread gets its own database connection; close it when done
+            try:
+                return retriever()
+            finally:
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            keyword_future = executor.submit(run, keyword_candidates)
+            semantic_future = executor.submit(run, semantic_candidates)
+            keyword_hits = keyword_future.result()
+            try:
+                semantic_hits = semantic_future.result()
+            except Exception as e:
+                logger.error(f"Semantic retrieval failed, hybrid search uses keyword results only: {str(e)}")
+                semantic_hits = []
+        
+        fused = reciprocal_rank_fusion(
+            {
+                'keyword': [pk for pk, _ in keyword_hits],
+                'semantic': [pk for pk, _ in semantic_hits],
+            },
+            weights=weights,
+            k=settings.HYBRID_RRF_K
+        )
+        keyword_ranks = dict(keyword_hits)
+        similarities = dict(semantic_hits)
+        documents = queryset.in_bulk([pk for pk, _ in fused])
+        
+        results = []
+        for pk, score in fused:
+            document = documents.get(pk)
+            if document is None:
+                continue
+            document.rank = keyword_ranks.get(pk)
+            document.similarity = similarities.get(pk)
+            document.fusion_score = score
+            results.append(document)
+        return results
+
     @action(detail=False, methods=['get'], url_path='semantic-search')
     def semantic_search(self, request):
         """
@@ -209,66 +414,67 @@ class DocumentViewSet(viewsets.ModelViewSet):
         - q: Search query in Indonesian or English
         - limit: Maximum number of results (default: 10)
         - threshold: Similarity threshold (default: 0.7)
+        - mode: 'ann' (HNSW index, default), 'exact' (full scan) or
+          'quantized' (binary codes, re-ranked by exact distance; served as
+          'ann' on pgvector < 0.7, reported in the response's mode)
+        - ef: HNSW candidate list size for mode=ann; higher is slower but
+          more accurate (default: ANN_DEFAULT_EF_SEARCH, at least limit;
+          at most 1000)
         """
         query = request.query_params.get('q', '')
         limit = int(request.query_params.get('limit', 10))
         threshold = float(request.query_params.get('threshold', 0.7))
+        mode = request.query_params.get('mode', 'ann').lower()
+        ef_search = min(
+            int(request.query_params.get('ef', max(settings.ANN_DEFAULT_EF_SEARCH, limit))),
+            HNSW_MAX_EF_SEARCH
+        )
         
         if not query:
             return Response(
                 {'error': 'Query parameter "q" is required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if mode not in ('ann', 'exact', 'quantized'):
+            return Response(
+                {'error': 'Query parameter "mode" must be "ann", "exact" or "quantized"'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        requested_mode = mode
+        if mode == 'quantized' and connection.vendor == 'postgresql' and not binary_quantize_supported():
+            # No binary_quantize() before pgvector 0.7: serve it from the HNSW index
+            mode = 'ann'
+        
+        unavailable = not_ready_response((MODELS,))
+        if unavailable is not None:
+            return unavailable
         
         try:
-            # Load the multilingual sentence transformer model
-            model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
-            
-            # Generate embedding for the query
-            query_embedding = model.encode(query)
-            
-            # Get all text chunks with embeddings
-            chunks = TextChunk.objects.filter(embedding__isnull=False)
-            
-            # Calculate similarities and filter by threshold
-            results = []
-            for chunk in chunks:
-                if chunk.embedding:
-                    # Convert stored embedding back to numpy array
-                    chunk_embedding = np.array(chunk.embedding)
-                    
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_embedding, chunk_embedding) / (
-                        np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
-                    )
-                    
-                    if similarity >= threshold:
-                        results.append({
-                            'chunk': chunk,
-                            'similarity': float(similarity)
-                        })
+            # Generate embedding for the query (cached for repeated queries)
+            query_embedding = encode_query(query, SEARCH_MODEL_NAME)
             
-            # Sort by similarity (highest first) and limit results
-            results.sort(key=lambda x: x['similarity'], reverse=True)
-            results = results[:limit]
+            # Rank in the database so only the top-k rows cross the wire
+            chunks = self._rank_text_chunks(query_embedding, limit, threshold, mode, ef_search)
             
             # Format response
             response_data = []
-            for result in results:
-                chunk = result['chunk']
+            for chunk in chunks:
                 response_data.append({
                     'kitab_name': chunk.kitab_name,
                     'author': chunk.author,
                     'ibaroh': chunk.content_arabic,
                     'terjemahan': self._generate_translation(chunk.content_arabic),
-                    'similarity_score': result['similarity'],
+                    'similarity_score': chunk.similarity,
                     'metadata': chunk.metadata
                 })
             
             return Response({
                 'query': query,
                 'results': response_data,
-                'total_found': len(response_data)
+                'total_found': len(response_data),
+                'mode': mode,
+                'requested_mode': requested_mode
             })
             
         except Exception as e:
@@ -277,6 +483,65 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def _rank_text_chunks(self, query_embedding, limit, threshold, mode='ann', ef_search=None):
+        """
+        Return up to ``limit`` text chunks with similarity >= ``threshold``,
+        best first, each carrying a ``similarity`` attribute.
+
+        On PostgreSQL the ranking is done by pgvector with
+        ``ORDER BY embedding <=> query LIMIT k``. In ``ann`` mode the HNSW index
+        serves it with ``hnsw.ef_search`` set for this transaction only; in
+        ``exact`` mode index scans are disabled so every chunk is compared. In
+        ``quantized`` mode the binary-quantized HNSW index (pgvector >= 0.7)
+        picks ``limit * QUANTIZED_RESCORE_FACTOR`` candidates by Hamming
+        distance, which are then re-ranked by exact cosine distance.
+        Other databases store embeddings as JSON and are scored in Python.
+        """
+        chunks = TextChunk.objects.filter(embedding__isnull=False)
+        
+        if connection.vendor == 'postgresql' and CosineDistance is not None:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if mode == 'exact':
+                    cursor.execute("SET LOCAL enable_indexscan = off")
+                elif mode == 'quantized':
+                    n_candidates = min(limit * settings.QUANTIZED_RESCORE_FACTOR, HNSW_MAX_EF_SEARCH)
+                    cursor.execute("SET LOCAL hnsw.ef_search = %s", [n_candidates])
+                    vector_literal = '[' + ','.join(str(float(x)) for x in query_embedding) + ']'
+                    candidates = chunks.annotate(
+                        hamming=RawSQL(
+                            "binary_quantize(embedding)::bit(768) <~> binary_quantize(%s::vector)",
+                            [vector_literal]
+                        )
+                    ).order_by('hamming').values_list('pk', flat=True)[:n_candidates]
+                    # Keep the float HNSW index out of the re-ranking so no
+                    # candidate is dropped; the id lookup uses a bitmap scan
+                    chunks = chunks.filter(pk__in=list(candidates))
+                    cursor.execute("SET LOCAL enable_indexscan = off")
+                else:
+                    cursor.execute(
+                        "SET LOCAL hnsw.ef_search = %s", [min(int(ef_search or limit), HNSW_MAX_EF_SEARCH)]
+                    )
+                ranked = list(
+                    chunks.only('kitab_name', 'author', 'content_arabic', 'metadata')
+                    .annotate(distance=CosineDistance('embedding', np.asarray(query_embedding).tolist()))
+                    .filter(distance__lte=1 - threshold)
+                    .order_by('distance')[:limit]
+                )
+            for chunk in ranked:
+                chunk.similarity = 1 - chunk.distance
+            return ranked
+        
+        chunks = list(chunks.only('kitab_name', 'author', 'content_arabic', 'metadata', 'embedding'))
+        if not chunks:
+            return []
+        index = ChunkEmbeddingIndex([chunk.embedding for chunk in chunks], chunks)
+        indices, scores = index.search(query_embedding, limit=limit, threshold=threshold)
+        ranked = []
+        for i, score in zip(indices, scores):
+            chunks[i].similarity = float(score)
+            ranked.append(chunks[i])
+        return ranked
+    
     def _generate_translation(self, arabic_text):
         """
         Generate Indonesian translation of Arabic text.
@@ -354,7 +619,26 @@ class TextChunkViewSet(viewsets.ModelViewSet):
     """
     queryset = TextChunk.objects.all()
     serializer_class = TextChunkSerializer
+    pagination_class = DocumentPagination
+    keyset_ordering = ('source_document_id', 'chunk_index')
+    filter_backends = [DjangoFilterBackend, ArabicSearchFilter, filters.OrderingFilter]
     filterset_fields = ['kitab_name', 'author']
-    search_fields = ['content_arabic', 'kitab_name', 'author']
+    # Normalized kitab_name + author + content_arabic, trigram indexed
+    search_fields = ['search_text']
     ordering_fields = ['created_at', 'chunk_index']
-    ordering = ['source_document', 'chunk_index'] 
\ No newline at end of file
+    ordering = ['source_document', 'chunk_index'] 
+    
+    def perform_destroy(self, instance):
+        # Saves refresh KitabStatistics through documents.signals; deletes here
+        key = (instance.kitab_name, instance.author)
+        instance.delete()
+        schedule_kitab_statistics_refresh([key])
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Per-kitab and per-author chunk counts from the materialized
+        KitabStatistics table, with ETag / If-None-Match revalidation.
+        """
+        etag = database_statistics_etag()
+        return conditional_response(request, etag, lambda: database_statistics(etag))
@@ -26,7 +26,7 @@ export interface Document {
   is_public: boolean;
   metadata: any;
   ocr_status: 'pending' | 'processing' | 'completed' | 'failed';
-  ocr_result: any;
+  ocr_result?: any; // detail responses only
 }
 
 export interface DocumentListResponse {
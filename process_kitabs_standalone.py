@@ -19,6 +19,10 @@ from datetime import datetime
 backend_dir = Path(__file__).parent / 'backend'
 sys.path.insert(0, str(backend_dir))
 
+from documents.embedding_store import write_embedding_store
+
+MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+
 def setup_django():
     """Setup Django environment."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -178,6 +182,16 @@ def save_chunks_to_json(all_chunks, output_file="processed_books_data.json"):
         print(f"❌ Error saving to JSON: {e}")
         return False
 
+def save_chunks_to_store(all_chunks, output_dir=".", name="kitabs"):
+    """Save all processed chunks to the binary, memory-mapped embedding store."""
+    try:
+        manifest = write_embedding_store(all_chunks, output_dir, name=name, model_name=MODEL_NAME)
+        print(f"💾 Saved {manifest['count']} chunks to {manifest['embeddings_file']} + {manifest['chunks_file']}")
+        return True
+    except Exception as e:
+        print(f"❌ Error saving embedding store: {e}")
+        return False
+
 def create_search_index(chunks_data, output_file="search_index.json"):
     """Create a simplified search index for quick lookup."""
     index = {
@@ -237,7 +251,7 @@ def main():
     # Load sentence transformer model
     print("🤖 Loading sentence transformer model...")
     try:
-        model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
+        model = SentenceTransformer(MODEL_NAME)
         print("✅ Model loaded successfully")
     except Exception as e:
         print(f"❌ Error loading model: {e}")
@@ -286,7 +300,7 @@ def main():
     
     if all_chunks:
         # Save final data
-        save_chunks_to_json(all_chunks, "kitabs_embeddings.json")
+        save_chunks_to_store(all_chunks)
         create_search_index(all_chunks, "kitabs_search_index.json")
         
         # Statistics
@@ -303,10 +317,10 @@ def main():
             print(f"   📚 {book}: {count} chunks")
         
         print(f"\n🎉 Semantic search data ready!")
-        print(f"   💾 Main data: kitabs_embeddings.json")
+        print(f"   💾 Embeddings: kitabs_embeddings.<generation>.npy (metadata: kitabs_chunks.<generation>.json, manifest: kitabs_store.json)")
         print(f"   📇 Search index: kitabs_search_index.json")
         print(f"\nNext steps:")
-        print(f"   1. Upload JSON files to your production environment")
+        print(f"   1. Upload the embedding store and search index to your production environment (kitabs_store.json last)")
         print(f"   2. Create API endpoint to load and search this data")
         print(f"   3. Test semantic search functionality")
         